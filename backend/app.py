@@ -1,25 +1,201 @@
 
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, Request, Response, request, jsonify, redirect, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
-import json
+import hashlib
+import hmac
+import tempfile
 from datetime import datetime
 import time
-from services.supabase_service import SupabaseService
 from services.auth_service import AuthService
-from services.file_service import FileService
-from services.appointment_service import AppointmentService
-from services.health_assessment_service import HealthAssessmentService
+from services.profile_repository import ProfileRepository
+from services.file_service import FileService, UploadTooLargeError, MAX_UPLOAD_BYTES
+from services.resumable_upload_service import ResumableUploadService, UploadNotFoundError
+from services.appointment_service import AppointmentService, InvalidCursorError, MAX_BATCH_UPDATES
+from services.slot_index import SlotUnavailableError
+from services.export_service import ExportService, EXPORT_FORMATS
+from services.health_assessment_service import HealthAssessmentService, DEFAULT_BATCH_CHUNK_SIZE
+from services import metrics
+from services.lazy import LazyService
+from services.json_provider import FastJSONProvider
+from services.compression import compress_response
+from services.rate_limiter import RateLimiter
+from services.idempotency import (IdempotencyStore, IdempotencyConflictError, IdempotencyInProgressError,
+                                  MAX_IDEMPOTENCY_KEY_LENGTH)
+
+# Number of reverse proxies in front of the app whose X-Forwarded-For can be trusted;
+# rate limits key on the client address, so this must match the deployment
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+# Bearer token for jobs and operators calling the maintenance endpoints; unset disables it
+SERVICE_API_TOKEN = os.environ.get('SERVICE_API_TOKEN')
+
+# Uploaded parts stay in memory up to this size and only then spill to a temp file
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 2 * 1024 * 1024))
+
+class AppRequest(Request):
+    @property
+    def max_content_length(self):
+        # Cap upload bodies early, leaving room for the multipart envelope;
+        # the exact file limit is enforced while streaming
+        if self.path.startswith('/api/storage/'):
+            return MAX_UPLOAD_BYTES + 64 * 1024
+        return super().max_content_length
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_THRESHOLD)
 
 app = Flask(__name__)
+app.request_class = AppRequest
+app.json = FastJSONProvider(app)
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
 CORS(app)
 
-# Initialize services
-supabase_service = SupabaseService()
-auth_service = AuthService(supabase_service)
-file_service = FileService(supabase_service)
-appointment_service = AppointmentService(supabase_service)
-health_assessment_service = HealthAssessmentService(supabase_service)
+# Initialize services. Each is built on first use in the worker process that uses it,
+# so importing the app stays cheap and nothing created before a fork is shared.
+def create_supabase_service():
+    # Deferred: the Supabase SDK and httpx are most of the app's import time
+    from services.supabase_service import SupabaseService
+    return SupabaseService()
+
+supabase_service = LazyService(create_supabase_service)
+profile_repository = LazyService(lambda: ProfileRepository(supabase_service.resolve()), 'ProfileRepository')
+auth_service = LazyService(
+    lambda: AuthService(supabase_service.resolve(), profile_repository.resolve()), 'AuthService')
+file_service = LazyService(lambda: FileService(supabase_service.resolve()), 'FileService')
+resumable_upload_service = LazyService(
+    lambda: ResumableUploadService(file_service.resolve()), 'ResumableUploadService')
+appointment_service = LazyService(lambda: AppointmentService(supabase_service.resolve()), 'AppointmentService')
+health_assessment_service = LazyService(
+    lambda: HealthAssessmentService(supabase_service.resolve()), 'HealthAssessmentService')
+rate_limiter = LazyService(RateLimiter)
+idempotency_store = LazyService(IdempotencyStore)
+export_service = LazyService(lambda: ExportService(supabase_service.resolve(), app.json.dumps), 'ExportService')
+
+SERVICES = (supabase_service, profile_repository, auth_service, file_service, resumable_upload_service,
+            appointment_service, health_assessment_service, rate_limiter, idempotency_store, export_service)
+
+def reset_services():
+    # Called in each freshly forked gunicorn worker
+    for service in SERVICES:
+        service.reset()
+
+def warm_up():
+    # Builds every service ahead of the first request that needs it
+    for service in SERVICES:
+        service.resolve()
+
+def service_caches():
+    # Only services that exist in this process report their caches
+    caches = {}
+    if supabase_service.initialized:
+        caches["supabase_client_pool"] = supabase_service.client_pool
+    if auth_service.initialized:
+        caches["session"] = auth_service.session_cache.cache
+    if profile_repository.initialized:
+        caches["profile"] = profile_repository.cache
+    if idempotency_store.initialized:
+        caches["idempotency"] = idempotency_store.completed
+    return caches
+
+metrics.registry.register_collector(metrics.cache_collector(service_caches))
+
+# Per-route latency, in-flight and error metrics; labelled by the url rule, not the
+# raw path, so ids in the URL don't create a series per request
+@app.before_request
+def start_request_timer():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_started = time.perf_counter()
+    metrics.http_requests_in_flight.inc(g.metrics_route)
+
+@app.after_request
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings)
+
+@app.teardown_request
+def observe_request(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    route = g.metrics_route
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+    metrics.http_requests_in_flight.dec(route)
+    metrics.http_request_duration.observe(request.method, route, str(status), value=time.perf_counter() - started)
+    if status >= 400:
+        metrics.http_request_errors.inc(route, str(status))
+
+def conditional_json(payload):
+    # Strong ETag from a hash of the payload, checked before the body is serialized.
+    # Payload dicts are built in a fixed key order, so repr() is stable for equal content.
+    etag = hashlib.blake2b(repr(payload).encode(), digest_size=16).hexdigest()
+    # Weak comparison, since compressed responses carry the tag as W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    # Polling clients must revalidate, and responses depend on the caller's token
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+def rate_limit(name, identity=None):
+    # Returns a 429 response when the caller is over the named limit, else None
+    retry_after = rate_limiter.check(name, request.remote_addr, identity)
+    if not retry_after:
+        return None
+    response = jsonify({"error": "Too many attempts, please try again later", "retryAfter": retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def require_role(*roles):
+    # Returns a 401/403 response unless the caller sends the service token or the
+    # access token of a user whose profile has one of `roles`, else None
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header[len('Bearer '):].strip() if auth_header.startswith('Bearer ') else ''
+    if not token:
+        return jsonify({"error": "Authentication required"}), 401
+    if SERVICE_API_TOKEN and hmac.compare_digest(token.encode(), SERVICE_API_TOKEN.encode()):
+        return None
+    
+    user = auth_service.get_session(token).get('user')
+    if not user:
+        return jsonify({"error": "Authentication required"}), 401
+    if user.get('role') not in roles:
+        return jsonify({"error": "Not allowed"}), 403
+    return None
+
+def idempotent(scope, compute):
+    # Runs compute() -> (payload, status) once per Idempotency-Key and request body;
+    # retries get the stored response back with an Idempotent-Replayed header
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        payload, status = compute()
+        return jsonify(payload), status
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({"error": f"Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters"}), 400
+    
+    fingerprint = hashlib.blake2b(request.get_data(), digest_size=16).hexdigest()
+    try:
+        (payload, status), replayed = idempotency_store.run(
+            f"{scope}:{key}", fingerprint, compute, keep=lambda outcome: outcome[1] < 400)
+    except IdempotencyConflictError as e:
+        return jsonify({"error": str(e)}), 422
+    except IdempotencyInProgressError as e:
+        return jsonify({"error": str(e)}), 409
+    
+    response = jsonify(payload)
+    response.status_code = status
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
 
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
@@ -33,6 +209,10 @@ def login():
     email = data.get('email')
     password = data.get('password')
     
+    limited = rate_limit('login', email)
+    if limited:
+        return limited
+    
     result = auth_service.login(email, password)
     if result.get('error'):
         return jsonify(result), 401
@@ -58,6 +238,10 @@ def register():
     password = data.get('password')
     name = data.get('name')
     
+    limited = rate_limit('register', email)
+    if limited:
+        return limited
+    
     result = auth_service.register(email, password, name)
     if result.get('error'):
         return jsonify(result), 400
@@ -65,7 +249,12 @@ def register():
 
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
-    result = auth_service.logout()
+    auth_header = request.headers.get('Authorization')
+    access_token = None
+    if auth_header and auth_header.startswith('Bearer '):
+        access_token = auth_header.split(' ')[1]
+    
+    result = auth_service.logout(access_token)
     return jsonify(result)
 
 @app.route('/api/auth/verify-phone', methods=['POST'])
@@ -76,6 +265,11 @@ def verify_phone():
     name = data.get('name')
     user_id = data.get('user_id')
     
+    # OTP guesses are throttled per account, falling back to the phone number
+    limited = rate_limit('verify_phone', user_id or phone)
+    if limited:
+        return limited
+    
     result = auth_service.verify_phone(user_id, phone, otp, name)
     if result.get('error'):
         return jsonify(result), 400
@@ -89,7 +283,18 @@ def get_session():
     
     token = auth_header.split(' ')[1]
     result = auth_service.get_session(token)
-    return jsonify(result)
+    if result.get('error'):
+        return jsonify(result)
+    return conditional_json(result)
+
+@app.route('/api/auth/client-pool', methods=['GET'])
+def client_pool_stats():
+    return jsonify(supabase_service.get_pool_stats())
+
+# Prometheus scrape endpoint; values are per worker process
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 # File storage endpoints
 @app.route('/api/storage/initialize', methods=['POST'])
@@ -99,6 +304,30 @@ def initialize_storage():
 
 @app.route('/api/storage/upload', methods=['POST'])
 def upload_file():
+    # Raw request bodies are piped straight through to storage; form fields move to the query string
+    if request.mimetype != 'multipart/form-data':
+        filename = request.args.get('filename')
+        if not filename:
+            return jsonify({"error": "Filename is required"}), 400
+        if request.content_length is None and not request.environ.get('wsgi.input_terminated'):
+            return jsonify({"error": "Content-Length is required"}), 411
+        
+        result = file_service.upload_file(
+            request.args.get('bucket_id'),
+            request.args.get('user_id'),
+            request.stream,
+            filename,
+            request.args.get('custom_path', None),
+            request.args.get('is_public', 'true').lower() == 'true',
+            content_type=request.mimetype or None,
+            content_length=request.content_length,
+            process_images=request.args.get('process_images', 'true').lower() == 'true',
+            content_sha256=request.headers.get('X-Content-SHA256')
+        )
+        if result.get('error'):
+            return jsonify(result), 400
+        return jsonify(result)
+    
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
     
@@ -110,21 +339,70 @@ def upload_file():
     user_id = request.form.get('user_id')
     custom_path = request.form.get('custom_path', None)
     is_public = request.form.get('is_public', 'true').lower() == 'true'
+    process_images = request.form.get('process_images', 'true').lower() == 'true'
     
-    # Save file temporarily
-    temp_path = f"/tmp/{int(time.time())}_{file.filename}"
-    file.save(temp_path)
+    # The part is already spooled (in memory below the threshold), so its size is known
+    file.stream.seek(0, os.SEEK_END)
+    size = file.stream.tell()
+    file.stream.seek(0)
     
-    result = file_service.upload_file(bucket_id, user_id, temp_path, file.filename, custom_path, is_public)
+    result = file_service.upload_file(bucket_id, user_id, file.stream, file.filename, custom_path, is_public,
+                                      content_type=file.mimetype or None, content_length=size,
+                                      process_images=process_images)
     
-    # Clean up temp file
-    if os.path.exists(temp_path):
-        os.remove(temp_path)
+    if result.get('error'):
+        return jsonify(result), 400
+    return jsonify(result)
+
+# Resumable uploads: create a session, PUT chunks at ?offset=N in any order, then complete
+@app.route('/api/storage/uploads', methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    result = resumable_upload_service.create(data)
+    if result.get('error'):
+        return jsonify(result), 400
+    return jsonify(result), 201
+
+@app.route('/api/storage/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    if request.content_length is None and not request.environ.get('wsgi.input_terminated'):
+        return jsonify({"error": "Content-Length is required"}), 411
     
+    result = resumable_upload_service.put_chunk(
+        upload_id,
+        request.args.get('offset', type=int),
+        request.stream,
+        content_length=request.content_length,
+        checksum=request.headers.get('X-Chunk-SHA256')
+    )
+    if result.get('error'):
+        return jsonify(result), 400
+    return jsonify(result)
+
+@app.route('/api/storage/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    return jsonify(resumable_upload_service.status(upload_id))
+
+@app.route('/api/storage/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    return jsonify(resumable_upload_service.abort(upload_id))
+
+@app.route('/api/storage/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    result = resumable_upload_service.complete(upload_id)
     if result.get('error'):
         return jsonify(result), 400
     return jsonify(result)
 
+@app.errorhandler(UploadNotFoundError)
+def upload_not_found(e):
+    return jsonify({"error": str(e)}), 404
+
+@app.errorhandler(UploadTooLargeError)
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"File exceeds the {MAX_UPLOAD_BYTES} byte limit"}), 413
+
 # Appointment endpoints
 @app.route('/api/appointments', methods=['GET'])
 def get_appointments():
@@ -132,34 +410,204 @@ def get_appointments():
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
     
-    result = appointment_service.get_appointments(user_id)
-    return jsonify(result)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"error": "Limit must be a positive integer"}), 400
+    
+    try:
+        result = appointment_service.get_appointments(
+            user_id,
+            after=request.args.get('after'),
+            limit=limit,
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to')
+        )
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
+    if result.get('error'):
+        return jsonify(result)
+    return conditional_json(result)
 
 @app.route('/api/appointments', methods=['POST'])
 def create_appointment():
     data = request.json
-    result = appointment_service.create_appointment(data)
+    
+    def create():
+        result = appointment_service.create_appointment(data)
+        return result, 400 if result.get('error') else 200
+    
+    return idempotent('appointments', create)
+
+@app.route('/api/availability', methods=['GET'])
+def get_availability():
+    # Free slots for `date` (or `from`..`to`), for `dietitian_id` or unassigned bookings
+    date_from = request.args.get('from') or request.args.get('date') or datetime.now().date().isoformat()
+    result = appointment_service.get_availability(
+        request.args.get('dietitian_id'),
+        date_from=date_from,
+        date_to=request.args.get('to') or date_from
+    )
     if result.get('error'):
         return jsonify(result), 400
     return jsonify(result)
 
+@app.errorhandler(SlotUnavailableError)
+def slot_unavailable(e):
+    return jsonify({"error": str(e)}), 409
+
 @app.route('/api/appointments/<appointment_id>', methods=['PUT'])
 def update_appointment(appointment_id):
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
     result = appointment_service.update_appointment(appointment_id, data)
     if result.get('error'):
         return jsonify(result), 400
     return jsonify(result)
 
+@app.route('/api/appointments/batch', methods=['POST'])
+def update_appointments_batch():
+    # Accepts [{id, status, ...}] or {"updates": [...]}; identical changes are applied together
+    data = request.get_json(silent=True)
+    updates = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(updates, list):
+        return jsonify({"error": "Expected a list of updates"}), 400
+    if len(updates) > MAX_BATCH_UPDATES:
+        return jsonify({"error": f"At most {MAX_BATCH_UPDATES} updates per request"}), 400
+    
+    result = appointment_service.update_appointments(updates)
+    return jsonify(result)
+
+@app.route('/api/dietitian/<dietitian_id>/appointments', methods=['GET'])
+def get_dietitian_appointments(dietitian_id):
+    # Defaults to today; `status` takes a comma-separated set. Lists client names and
+    # phone numbers, so staff or the service token only, like the exports
+    denied = require_role('admin', 'dietitian')
+    if denied:
+        return denied
+    
+    today = datetime.now().date().isoformat()
+    date_from = request.args.get('from') or today
+    date_to = request.args.get('to') or date_from
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"error": "Limit must be a positive integer"}), 400
+    
+    try:
+        result = appointment_service.get_dietitian_appointments(
+            dietitian_id,
+            statuses=statuses,
+            date_from=date_from,
+            date_to=date_to,
+            after=request.args.get('after'),
+            limit=limit
+        )
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
+    if result.get('error'):
+        return jsonify(result)
+    return conditional_json(result)
+
 # Health assessment endpoints
 @app.route('/api/health-assessment', methods=['POST'])
 def submit_health_assessment():
     data = request.json
-    result = health_assessment_service.submit_health_assessment(data)
+    
+    def submit():
+        result = health_assessment_service.submit_health_assessment(data)
+        return result, 400 if result.get('error') else 200
+    
+    return idempotent('health-assessment', submit)
+
+@app.route('/api/health-assessment/batch', methods=['POST'])
+def submit_health_assessment_batch():
+    chunk_size = request.args.get('chunk_size', DEFAULT_BATCH_CHUNK_SIZE, type=int)
+    
+    # NDJSON is parsed line by line as it arrives; anything else must be a JSON array
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = iter_ndjson(request.stream)
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            return jsonify({"error": "Expected a JSON array or NDJSON body"}), 400
+    
+    result = health_assessment_service.submit_batch(records, chunk_size)
+    return jsonify(result)
+
+@app.route('/api/health-assessment/metrics/recompute', methods=['POST'])
+def recompute_health_assessment_metrics():
+    # Rewrites derived_metrics on stored assessments whose values differ from the current formulas
+    denied = require_role('admin')
+    if denied:
+        return denied
+    
+    chunk_size = request.args.get('chunk_size', DEFAULT_BATCH_CHUNK_SIZE, type=int)
+    result = health_assessment_service.recompute_metrics(chunk_size)
     if result.get('error'):
-        return jsonify(result), 400
+        return jsonify(result), 500
     return jsonify(result)
 
+# Export endpoints: every matching row, streamed page by page as NDJSON or CSV
+@app.route('/api/export/assessments', methods=['GET'])
+def export_assessments():
+    return export_response('assessments', lambda fmt, gzip: export_service.export_assessments(
+        fmt,
+        user_id=request.args.get('user_id'),
+        page_size=request.args.get('page_size', type=int),
+        gzip=gzip
+    ))
+
+@app.route('/api/export/appointments', methods=['GET'])
+def export_appointments():
+    return export_response('appointments', lambda fmt, gzip: export_service.export_appointments(
+        fmt,
+        user_id=request.args.get('user_id'),
+        dietitian_id=request.args.get('dietitian_id'),
+        date_from=request.args.get('from'),
+        date_to=request.args.get('to'),
+        page_size=request.args.get('page_size', type=int),
+        gzip=gzip
+    ))
+
+def export_response(name, start):
+    # Whole-table reads of health and booking data: staff or the service token only,
+    # checked before the first page is fetched
+    denied = require_role('admin', 'dietitian')
+    if denied:
+        return denied
+    
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    # compress_response leaves streamed bodies alone, so gzip is applied as the rows are written
+    gzip = bool(request.accept_encodings['gzip'])
+    try:
+        chunks = start(fmt, gzip)
+    except Exception as e:
+        print(f"Error starting {name} export: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    
+    response = Response(chunks, mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def iter_ndjson(stream):
+    line_number = 0
+    for line in stream:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield app.json.loads(line)
+        except ValueError:
+            yield ValueError(f"Invalid JSON on line {line_number}")
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
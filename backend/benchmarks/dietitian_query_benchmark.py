@@ -0,0 +1,64 @@
+import argparse
+import os
+import statistics
+import time
+import uuid
+
+# Times one dietitian's week of appointments as the appointments table grows, with
+# and without the column index the memory backend keeps for eq filters (standing
+# in for appointments_dietitian_date_idx). Other dietitians' rows grow the table;
+# the target dietitian's schedule stays the same size.
+#
+#   cd backend && python -m benchmarks.dietitian_query_benchmark --sizes 1000 10000 100000
+
+os.environ['SUPABASE_BACKEND'] = 'memory'
+
+DIETITIAN_ID = str(uuid.uuid4())
+ROWS_PER_DIETITIAN = 500
+
+def seed(service, total):
+    rows = []
+    for i in range(total):
+        dietitian_id = DIETITIAN_ID if i < ROWS_PER_DIETITIAN else f"other-{i // ROWS_PER_DIETITIAN}"
+        rows.append({
+            'user_id': f"client-{i % 997}",
+            'dietitian_id': dietitian_id,
+            'appointment_date': f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            'appointment_time': f"{1 + i % 12}:00 {'AM' if i % 2 else 'PM'}",
+            'status': ('requested', 'confirmed', 'cancelled')[i // 7 % 3],
+            'reason': 'video consultation request',
+            'notes': 'video session requested by client'
+        })
+    service.get_client().table('appointments').insert(rows).execute()
+
+def time_query(appointment_service, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = appointment_service.get_dietitian_appointments(
+            DIETITIAN_ID, statuses=['requested', 'confirmed'], date_from='2024-03-01', date_to='2024-03-07')
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result['total']
+
+def main():
+    parser = argparse.ArgumentParser(description="Dietitian schedule query time against table size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    from services.supabase_service import SupabaseService
+    from services.appointment_service import AppointmentService
+
+    print(f"{'rows':>9} {'indexed ms':>11} {'scan ms':>9} {'matched':>8}")
+    for size in args.sizes:
+        service = SupabaseService()
+        appointment_service = AppointmentService(service)
+        seed(service, size)
+
+        indexed_ms, matched = time_query(appointment_service, args.iterations)
+        service.memory.use_indexes = False
+        scan_ms, _ = time_query(appointment_service, args.iterations)
+        print(f"{size:>9} {indexed_ms:>11.2f} {scan_ms:>9.2f} {matched:>8}")
+
+if __name__ == "__main__":
+    main()
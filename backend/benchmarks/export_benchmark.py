@@ -0,0 +1,59 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+# Peak Python memory and time for exporting every appointment: the streamed export
+# against building the whole NDJSON body in memory first (one query, one join),
+# on the in-memory backend. The streamed peak should stay flat as --rows grows.
+# The in-memory tables have no indexes, so every page there is a full scan and
+# the streamed time grows with rows x pages; in Postgres each page is an index
+# range scan (appointments_date_id_idx).
+#
+#   cd backend && python -m benchmarks.export_benchmark --rows 20000
+
+os.environ['SUPABASE_BACKEND'] = 'memory'
+
+from services.export_service import EXPORT_APPOINTMENT_COLUMNS, appointment_records
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    import app as app_module
+    client = app_module.supabase_service.get_client()
+    for start in range(0, args.rows, 5000):
+        client.table('appointments').insert([{
+            'appointment_date': f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            'appointment_time': f"{1 + i % 12}:00 {'AM' if i % 2 else 'PM'}",
+            'status': 'confirmed', 'notes': 'follow-up on meal plan', 'user_id': f"user-{i % 500}"
+        } for i in range(start, min(start + 5000, args.rows))]).execute()
+    exports = app_module.export_service.resolve()
+    dumps = app_module.app.json.dumps
+
+    def buffered():
+        rows = client.table('appointments').select(EXPORT_APPOINTMENT_COLUMNS) \
+            .order('appointment_date,id').execute().data
+        return len(''.join(dumps(record) + '\n' for record in appointment_records(rows)).encode())
+
+    def streamed():
+        return sum(len(chunk) for chunk in exports.export_appointments(page_size=args.page_size))
+
+    print(f"{args.rows} appointments, pages of {args.page_size}")
+    for label, fn in (("buffered", buffered), ("streamed", streamed)):
+        size, elapsed, peak = measure(fn)
+        print(f"  {label:<10} {elapsed * 1000:9.1f} ms  peak {peak / 1e6:8.1f} MB  ({size / 1e6:.1f} MB out)")
+
+if __name__ == "__main__":
+    main()
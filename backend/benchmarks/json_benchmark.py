@@ -0,0 +1,91 @@
+import argparse
+import gzip
+import statistics
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from services.appointment_transformer import transform_rows
+from services.compression import brotli, GZIP_LEVEL, BROTLI_QUALITY
+from services.json_provider import FastJSONProvider, orjson
+
+# Encode time and body size of large API payloads under Flask's stdlib JSON
+# provider and the orjson-backed FastJSONProvider, plus gzip/brotli sizes.
+#
+#   cd backend && python -m benchmarks.json_benchmark --appointments 10000 --assessments 1000
+
+def appointments_payload(count):
+    rows = [{
+        'id': f"00000000-0000-0000-0000-{i:012d}",
+        'appointment_date': f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        'appointment_time': f"{1 + i % 12}:30 {'AM' if i % 2 else 'PM'}",
+        'status': 'confirmed',
+        'reason': 'video consultation request',
+        'notes': 'video session requested by client',
+        'dietitian': {'name': 'Dr. Bench'}
+    } for i in range(count)]
+    return {"appointments": transform_rows(rows), "nextCursor": None}
+
+def assessments_payload(count):
+    return {"assessments": [{
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "user_id": f"user-{i % 97}",
+        "full_name": "Bench Client",
+        "age": "34", "height": "170", "height_unit": "cm", "weight": "68", "weight_unit": "kg",
+        "sex": "female", "city": "Pune",
+        "health_concerns": ["weight management", "energy levels"],
+        "medical_conditions": ["thyroid"],
+        "diet_type": "vegetarian",
+        "meals": [{"time": f"{8 + m * 4:02d}:00", "description": "Oats with fruit and nuts"} for m in range(4)],
+        "activities": [{"name": "walking", "duration": "30 min"}],
+        "photo_urls": [], "medical_report_urls": []
+    } for i in range(count)]}
+
+def measure(provider, payload, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        body = provider.response(payload).get_data()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, body
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON encode time and size per provider")
+    parser.add_argument("--appointments", type=int, default=10000)
+    parser.add_argument("--assessments", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = [("stdlib", DefaultJSONProvider(app))]
+    if orjson is not None:
+        providers.append(("orjson", FastJSONProvider(app)))
+
+    payloads = [
+        (f"{args.appointments} appointments", appointments_payload(args.appointments)),
+        (f"{args.assessments} assessments", assessments_payload(args.assessments))
+    ]
+
+    print(f"{'payload':<22} {'provider':<8} {'encode ms':>10} {'bytes':>10} {'gzip':>9} {'gzip ms':>8} "
+          f"{'br':>9} {'br ms':>7}")
+    with app.app_context():
+        for label, payload in payloads:
+            for name, provider in providers:
+                encode_ms, body = measure(provider, payload, args.iterations)
+
+                started = time.perf_counter()
+                gzipped = len(gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+                gzip_ms = (time.perf_counter() - started) * 1000
+
+                br, br_ms = "-", "-"
+                if brotli is not None:
+                    started = time.perf_counter()
+                    br = len(brotli.compress(body, quality=BROTLI_QUALITY))
+                    br_ms = f"{(time.perf_counter() - started) * 1000:.1f}"
+
+                print(f"{label:<22} {name:<8} {encode_ms:>10.2f} {len(body):>10} {gzipped:>9} {gzip_ms:>8.1f} "
+                      f"{br:>9} {br_ms:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.stub_supabase import StubSupabase, USER_ID, PROFILE_PHONE, make_token
+
+# Drives /api/appointments and /api/auth/session with many concurrent clients
+# against a gunicorn server whose Supabase calls go to a local stub.
+#
+#   cd backend && python -m benchmarks.load_benchmark --worker-class sync gevent
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_server(worker_class, workers, port, supabase_url):
+    env = dict(os.environ,
+               SUPABASE_URL=supabase_url,
+               PORT=str(port),
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_WORKERS=str(workers))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            status, _ = request(port, "/api/health")
+            if status == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not become ready")
+
+def request(port, path, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+def session_loaded(body):
+    # /api/auth/session answers 200 even when the profile fetch failed, and the stub
+    # only returns the profile to the user's own token; anything else is an error
+    data = json.loads(body)
+    return not data.get('error') and (data.get('user') or {}).get('phone') == PROFILE_PHONE
+
+def run_load(port, path, concurrency, duration, per_client_headers, check=None):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(index):
+        headers = per_client_headers(index)
+        local = []
+        failed = 0
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            try:
+                status, body = request(port, path, headers)
+                if status != 200 or (check and not check(body)):
+                    failed += 1
+            except OSError:
+                failed += 1
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed if elapsed else 0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load benchmark against a stub Supabase")
+    parser.add_argument("--worker-class", nargs="+", default=["sync", "gevent"])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub upstream latency in seconds")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    # One token per client, so the session cache warms up like it would for real users
+    tokens = [make_token() for _ in range(args.concurrency)]
+    scenarios = [
+        ("/api/appointments", f"/api/appointments?user_id={USER_ID}", lambda i: {}, None),
+        ("/api/auth/session", "/api/auth/session", lambda i: {"Authorization": f"Bearer {tokens[i]}"}, session_loaded)
+    ]
+
+    print(f"{args.concurrency} clients, {args.duration:.0f}s per run, "
+          f"{args.workers} workers, {args.latency * 1000:.0f} ms upstream latency")
+    print(f"{'worker':<8} {'endpoint':<20} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+    with StubSupabase(latency=args.latency) as stub:
+        for worker_class in args.worker_class:
+            process = start_server(worker_class, args.workers, args.port, stub.url)
+            try:
+                for name, path, headers, check in scenarios:
+                    result = run_load(args.port, path, args.concurrency, args.duration, headers, check)
+                    print(f"{worker_class:<8} {name:<20} {result['rps']:>9.1f} {result['p50_ms']:>9.1f} "
+                          f"{result['p99_ms']:>9.1f} {result['errors']:>7}")
+            finally:
+                process.terminate()
+                process.wait()
+
+if __name__ == "__main__":
+    main()
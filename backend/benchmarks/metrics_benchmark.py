@@ -0,0 +1,87 @@
+import argparse
+import os
+import random
+import time
+
+# Times the nutrition metrics engine: computing every record from scratch (what each
+# dashboard did client-side per read) against the memoized batch path, and the full
+# recompute job over stored assessments on the in-memory backend.
+#
+#   cd backend && python -m benchmarks.metrics_benchmark --rows 10000
+
+os.environ['SUPABASE_BACKEND'] = 'memory'
+
+from services import nutrition_metrics
+from services.nutrition_metrics import compute_metrics, compute_batch
+
+PARSERS = (nutrition_metrics.height_cm, nutrition_metrics.weight_kg,
+           nutrition_metrics.age_years, nutrition_metrics.clock_minutes)
+
+def make_rows(count, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        feet = rng.random() < 0.6
+        rows.append({
+            'age': str(rng.randint(18, 75)),
+            'sex': rng.choice(('male', 'female')),
+            'height': f"{rng.randint(4, 6)}'{rng.randint(0, 11)}" if feet else str(rng.randint(145, 195)),
+            'height_unit': 'feet' if feet else 'cm',
+            'weight': str(rng.randint(45, 120)),
+            'weight_unit': rng.choice(('kg', 'kg', 'lbs')),
+            'wakeup_time': f"{rng.randint(5, 8)}:{rng.choice(('00', '15', '30', '45'))} AM",
+            'sleep_time': f"{rng.randint(9, 11)}:{rng.choice(('00', '30'))} PM",
+            'meals': [{"time": f"{hour}:{rng.choice(('00', '30'))} {meridiem}", "description": "meal"}
+                      for hour, meridiem in ((8, 'AM'), (1, 'PM'), (5, 'PM'), (8, 'PM'))],
+            'activities': [{"type": rng.choice(('Walk', 'Yoga', 'Gym', 'None')), "time": "6:30 AM",
+                            "duration": rng.choice(('15', '30', '45', '60'))}]
+        })
+    return rows
+
+def clear_caches():
+    for parser in PARSERS:
+        parser.cache_clear()
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+
+    def uncached():
+        results = []
+        for row in rows:
+            clear_caches()
+            results.append(compute_metrics(row))
+        return results
+
+    expected, cold = timed(uncached)
+    clear_caches()
+    first, batch_cold = timed(lambda: compute_batch(rows))
+    second, batch_warm = timed(lambda: compute_batch(rows))
+    assert expected == first == second
+
+    print(f"{args.rows} assessments")
+    print(f"  per record, nothing memoized   {cold * 1000:9.1f} ms")
+    print(f"  compute_batch, cold caches     {batch_cold * 1000:9.1f} ms")
+    print(f"  compute_batch, warm caches     {batch_warm * 1000:9.1f} ms")
+
+    import app as app_module
+    client = app_module.supabase_service.get_client()
+    for start in range(0, len(rows), 1000):
+        client.table('health_assessments').insert(rows[start:start + 1000]).execute()
+
+    service = app_module.health_assessment_service
+    for label in ("recompute, all rows stale", "recompute, nothing changed"):
+        result, elapsed = timed(lambda: service.recompute_metrics(args.chunk_size))
+        print(f"  {label:<30} {elapsed * 1000:9.1f} ms  "
+              f"({result['scanned']} scanned, {result['updated']} updated)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from services.slot_index import slot_label
+
+# Drives every Flask route in app.py against the in-memory Supabase backend and
+# reports p50/p95/p99 latency and throughput per route. Each run is saved as JSON
+# under benchmarks/results/ and compared with the previous run.
+#
+#   cd backend && python -m benchmarks.route_benchmark --iterations 500
+
+os.environ['SUPABASE_BACKEND'] = 'memory'
+# Scenarios repeat the same login and OTP from one address; keep them out of the auth rate limits
+for limit in ('LOGIN', 'REGISTER', 'VERIFY_PHONE'):
+    for scope in ('IP', 'IDENTITY'):
+        os.environ.setdefault(f'RATE_LIMIT_{limit}_{scope}', '0')
+# Maintenance endpoints need the service token
+os.environ.setdefault('SERVICE_API_TOKEN', 'benchmark-service-token')
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class Context:
+    # Seeded users, tokens and rows shared by the scenarios
+    def __init__(self, app_module):
+        self.app = app_module
+        self.memory = app_module.supabase_service.memory
+        self.password = "benchmark-password"
+        self.user = self.memory.add_user("client@example.com", self.password, name="Bench Client")
+        self.user_id = self.user.id
+        self.token = self.memory.sign_in("client@example.com", self.password).session.access_token
+
+        self.dietitian = self.memory.add_user("dietitian@example.com", self.password, name="Dr. Bench", role="dietitian")
+        self.dietitian_token = self.memory.sign_in("dietitian@example.com", self.password).session.access_token
+
+        appointments = [{
+            'appointment_date': f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            'appointment_time': f"{1 + i % 12}:00 {'AM' if i % 2 else 'PM'}",
+            'status': 'confirmed',
+            'reason': 'video consultation request',
+            'notes': 'video session requested by client',
+            'user_id': self.user_id,
+            'dietitian_id': self.dietitian.id if i % 2 else None
+        } for i in range(200)]
+        self.appointment_ids = [row['id'] for row in
+                                app_module.supabase_service.get_client().table('appointments').insert(appointments).execute().data]
+        self.assessment = {"user_id": self.user_id, "fullName": "Bench Client", "age": "34",
+                           "height": "170", "heightUnit": "cm", "weight": "68", "weightUnit": "kg",
+                           "meals": [{"time": "08:00", "description": "Oats"}]}
+        # Rows stored before derived_metrics existed, for the recompute scenario
+        app_module.supabase_service.get_client().table('health_assessments').insert([{
+            'user_id': self.user_id, 'age': str(20 + i % 50), 'sex': ('male', 'female')[i % 2],
+            'height': f"5.{i % 12}", 'height_unit': 'feet', 'weight': str(50 + i % 60), 'weight_unit': 'kg',
+            'wakeup_time': '6:30 AM', 'sleep_time': '10:30 PM',
+            'meals': [{"time": "7:00 AM"}, {"time": "1:00 PM"}, {"time": "8:30 PM"}]
+        } for i in range(200)]).execute()
+
+    def open_upload(self, size, fill=False):
+        # A resumable upload session, optionally with every chunk already received
+        uploads = self.app.resumable_upload_service
+        upload = uploads.create({"bucket_id": "user_uploads", "user_id": self.user_id,
+                                 "filename": "report.pdf", "size": size, "chunk_size": 64 * 1024})
+        if fill:
+            for offset in range(0, size, upload["chunkSize"]):
+                uploads.put_chunk(upload["uploadId"], offset, io.BytesIO(b'x' * min(upload["chunkSize"], size - offset)))
+        return upload["uploadId"]
+
+    def photo(self):
+        # A 12 MP-class camera JPEG, or None when Pillow isn't installed
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        output = io.BytesIO()
+        Image.effect_noise((2000, 1500), 40).convert('RGB').save(output, 'JPEG', quality=90)
+        return output.getvalue()
+
+    def auth(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def dietitian_auth(self):
+        return {"Authorization": f"Bearer {self.dietitian_token}"}
+
+    def service_auth(self):
+        return {"Authorization": f"Bearer {os.environ['SERVICE_API_TOKEN']}"}
+
+def scenarios(ctx):
+    # (name, method, rule, request kwargs factory); the rule ties a scenario to a url_map entry
+    payload = b'x' * 256 * 1024
+    photo = ctx.photo()
+    return [
+        ("health", "GET", "/api/health", lambda i: {}),
+        ("auth.login", "POST", "/api/auth/login",
+         lambda i: {"json": {"email": "client@example.com", "password": ctx.password}}),
+        ("auth.google_login", "POST", "/api/auth/google-login",
+         lambda i: {"json": {"access_token": f"google-token-{i % 50}"}}),
+        ("auth.register", "POST", "/api/auth/register",
+         lambda i: {"json": {"email": f"new-{uuid.uuid4().hex}@example.com", "password": "pw", "name": "New"}}),
+        ("auth.logout", "POST", "/api/auth/logout", lambda i: {}),
+        ("auth.verify_phone", "POST", "/api/auth/verify-phone",
+         lambda i: {"json": {"user_id": ctx.user_id, "phone": "9876543210", "otp": "123456", "name": "Bench Client"}}),
+        ("auth.session", "GET", "/api/auth/session", lambda i: {"headers": ctx.auth()}),
+        ("auth.client_pool", "GET", "/api/auth/client-pool", lambda i: {}),
+        ("metrics", "GET", "/api/metrics", lambda i: {}),
+        ("storage.initialize", "POST", "/api/storage/initialize", lambda i: {}),
+        # Distinct content per iteration, so uploads aren't answered by deduplication
+        ("storage.upload_multipart", "POST", "/api/storage/upload",
+         lambda i: {"data": {"file": (io.BytesIO(payload + i.to_bytes(8, 'big')), "report.pdf"),
+                             "bucket_id": "user_uploads", "user_id": ctx.user_id}, "content_type": "multipart/form-data"}),
+        ("storage.upload_duplicate", "POST", "/api/storage/upload",
+         lambda i: {"data": {"file": (io.BytesIO(payload), "report.pdf"), "bucket_id": "user_uploads",
+                             "user_id": ctx.user_id}, "content_type": "multipart/form-data"}),
+        ("storage.upload_image", "POST", "/api/storage/upload",
+         lambda i: {"data": {"file": (io.BytesIO((photo or payload) + i.to_bytes(8, 'big')), "photo.jpg", "image/jpeg"),
+                             "bucket_id": "user_uploads", "user_id": ctx.user_id}, "content_type": "multipart/form-data"}),
+        ("storage.upload_raw", "POST", "/api/storage/upload",
+         lambda i: {"query_string": {"bucket_id": "user_uploads", "user_id": ctx.user_id, "filename": "report.pdf"},
+                    "data": payload, "content_type": "application/pdf"}),
+        ("storage.upload_session_create", "POST", "/api/storage/uploads",
+         lambda i: {"json": {"bucket_id": "user_uploads", "user_id": ctx.user_id, "filename": "report.pdf",
+                             "size": len(payload)}}),
+        ("storage.upload_chunk", "PUT", "/api/storage/uploads/<upload_id>",
+         lambda i: {"path": f"/api/storage/uploads/{ctx.open_upload(len(payload))}?offset=0",
+                    "data": payload[:64 * 1024]}),
+        ("storage.upload_session_status", "GET", "/api/storage/uploads/<upload_id>",
+         lambda i: {"path": f"/api/storage/uploads/{ctx.open_upload(len(payload), fill=True)}"}),
+        ("storage.upload_session_complete", "POST", "/api/storage/uploads/<upload_id>/complete",
+         lambda i: {"path": f"/api/storage/uploads/{ctx.open_upload(len(payload), fill=True)}/complete"}),
+        ("appointments.list", "GET", "/api/appointments",
+         lambda i: {"query_string": {"user_id": ctx.user_id}}),
+        ("appointments.page", "GET", "/api/appointments",
+         lambda i: {"query_string": {"user_id": ctx.user_id, "limit": 20}}),
+        # Every create takes a free slot: 16 a day, then the next day
+        ("appointments.create", "POST", "/api/appointments",
+         lambda i: {"json": {"date": (datetime(2025, 3, 1) + timedelta(days=i // 16)).date().isoformat(),
+                             "time": slot_label(9 * 60 + i % 16 * 30), "type": "video", "userId": ctx.user_id,
+                             "dietitianId": ctx.dietitian.id}}),
+        # A client retrying one create: after the first call every request is a replay
+        ("appointments.create_replay", "POST", "/api/appointments",
+         lambda i: {"json": {"date": "2026-03-02", "time": "10:30 AM", "type": "video", "userId": ctx.user_id},
+                    "headers": {"Idempotency-Key": "bench-create-replay"}}),
+        ("appointments.availability", "GET", "/api/availability",
+         lambda i: {"query_string": {"from": "2025-03-01", "to": "2025-03-07", "dietitian_id": ctx.dietitian.id}}),
+        ("appointments.update", "PUT", "/api/appointments/<appointment_id>",
+         lambda i: {"path": f"/api/appointments/{ctx.appointment_ids[i % len(ctx.appointment_ids)]}",
+                    "json": {"status": "confirmed", "notes": "updated"}}),
+        ("appointments.batch_update", "POST", "/api/appointments/batch",
+         lambda i: {"json": [{"id": appointment_id, "status": ("confirmed", "cancelled")[i % 2]}
+                             for appointment_id in ctx.appointment_ids[:50]]}),
+        ("dietitian.appointments", "GET", "/api/dietitian/<dietitian_id>/appointments",
+         lambda i: {"path": f"/api/dietitian/{ctx.dietitian.id}/appointments", "headers": ctx.dietitian_auth(),
+                    "query_string": {"from": "2024-01-01", "to": "2024-06-30", "status": "confirmed,requested"}}),
+        # Before the submit scenarios, so it scans the 200 seeded rows rather than everything they add
+        ("health_assessment.recompute_metrics", "POST", "/api/health-assessment/metrics/recompute",
+         lambda i: {"headers": ctx.service_auth()}),
+        # Also ahead of the submits; buffered so the whole streamed body is timed
+        ("export.assessments", "GET", "/api/export/assessments",
+         lambda i: {"query_string": {"page_size": 50}, "headers": ctx.service_auth(), "buffered": True}),
+        ("export.appointments", "GET", "/api/export/appointments",
+         lambda i: {"query_string": {"format": "csv", "page_size": 50},
+                    "headers": {"Accept-Encoding": "gzip", **ctx.dietitian_auth()}, "buffered": True}),
+        ("health_assessment.submit", "POST", "/api/health-assessment", lambda i: {"json": ctx.assessment}),
+        ("health_assessment.batch", "POST", "/api/health-assessment/batch",
+         lambda i: {"json": [ctx.assessment] * 50}),
+    ]
+
+def run_scenario(client, method, rule, make_kwargs, iterations):
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        kwargs = make_kwargs(i)
+        path = kwargs.pop("path", rule)
+        begin = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        latencies.append(time.perf_counter() - begin)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "throughput_rps": round(iterations / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3)
+    }
+
+def previous_result():
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, 'routes-*.json')))
+    if not paths:
+        return None, None
+    with open(paths[-1]) as f:
+        return paths[-1], json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-route latency benchmark on the in-memory backend")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--only", nargs="*", help="run only these scenario names")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 increase reported as a regression")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    import app as app_module
+    ctx = Context(app_module)
+    client = app_module.app.test_client()
+    client.post('/api/storage/initialize')
+
+    selected = [s for s in scenarios(ctx) if not args.only or s[0] in args.only]
+    covered = {rule for _, _, rule, _ in scenarios(ctx)}
+    missing = sorted(rule.rule for rule in app_module.app.url_map.iter_rules()
+                     if rule.endpoint != 'static' and rule.rule not in covered)
+    if missing:
+        print(f"warning: routes without a scenario: {', '.join(missing)}")
+
+    previous_path, previous = previous_result()
+    results = {}
+    print(f"{'route':<32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}  vs previous p95")
+    for name, method, rule, make_kwargs in selected:
+        result = run_scenario(client, method, rule, make_kwargs, args.iterations)
+        results[name] = result
+
+        comparison = ""
+        before = (previous or {}).get("routes", {}).get(name)
+        if before and before.get("p95_ms"):
+            change = result["p95_ms"] / before["p95_ms"] - 1
+            comparison = f"{change:+.0%}" + ("  REGRESSION" if change > args.threshold else "")
+        print(f"{name:<32} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f} "
+              f"{result['throughput_rps']:>9.1f} {result['errors']:>7}  {comparison}")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"routes-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w') as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(),
+                "python": sys.version.split()[0],
+                "iterations": args.iterations,
+                "routes": results
+            }, f, indent=2)
+        print(f"saved {path}" + (f" (compared with {os.path.basename(previous_path)})" if previous_path else ""))
+
+if __name__ == "__main__":
+    main()
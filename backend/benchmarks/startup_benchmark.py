@@ -0,0 +1,98 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures how long a fresh process takes to answer its first /api/health with a
+# 200: in a bare interpreter (import app, then one test-client request), and
+# optionally as a real gunicorn server polled over HTTP. "eager" builds every
+# service before the first request, which is what importing the app used to do.
+#
+#   cd backend && python -m benchmarks.startup_benchmark --runs 10 --gunicorn sync gevent
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if sys.argv[1] == 'eager':
+    app.warm_up()
+response = app.app.test_client().get('/api/health')
+ready = time.perf_counter()
+app.warm_up()
+print(json.dumps({"import": imported - started, "first_200": ready - started,
+                  "warm": time.perf_counter() - ready, "status": response.status_code}))
+"""
+
+def probe(mode):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", PROBE, mode], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - started
+    return result
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def gunicorn_ready(worker_class, warm, timeout=60):
+    # Seconds from spawning gunicorn to the first 200 on /api/health
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS="1",
+               GUNICORN_WARM_SERVICES="true" if warm else "false")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "app:app"],
+                               cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("GET", "/api/health")
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+            finally:
+                conn.close()
+        raise RuntimeError(f"gunicorn ({worker_class}) did not become ready")
+    finally:
+        process.terminate()
+        process.wait()
+
+def summarize(values):
+    values = sorted(values)
+    return f"{statistics.median(values) * 1000:9.1f} {values[0] * 1000:9.1f} {values[-1] * 1000:9.1f}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--gunicorn", nargs="*", default=[], metavar="WORKER_CLASS",
+                        help="also time gunicorn with these worker classes, e.g. sync gevent")
+    args = parser.parse_args()
+
+    print(f"{'process (ms)':<34} {'p50':>9} {'min':>9} {'max':>9}")
+    for mode in ("lazy", "eager"):
+        results = [probe(mode) for _ in range(args.runs)]
+        print(f"{mode + ' import app':<34} {summarize([r['import'] for r in results])}")
+        print(f"{mode + ' first 200 (in process)':<34} {summarize([r['first_200'] for r in results])}")
+        print(f"{mode + ' first 200 (incl. interpreter)':<34} "
+              f"{summarize([r['process'] - r['warm'] for r in results])}")
+        if mode == "lazy":
+            print(f"{'lazy service build afterwards':<34} {summarize([r['warm'] for r in results])}")
+
+    for worker_class in args.gunicorn:
+        for warm in (True, False):
+            label = f"gunicorn {worker_class}{' +warm' if warm else ''}"
+            print(f"{label:<34} {summarize([gunicorn_ready(worker_class, warm) for _ in range(args.runs)])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import base64
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# A minimal HTTP stand-in for the Supabase REST, auth and storage endpoints the
+# backend calls, with a fixed artificial latency per request
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+# Only present in the profile row, so a caller can tell it was read with the user's token
+PROFILE_PHONE = "+910000000001"
+
+def make_token(user_id=USER_ID, ttl=3600):
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+    header = encode({"alg": "HS256", "typ": "JWT"})
+    payload = encode({"sub": user_id, "exp": int(time.time()) + ttl, "jti": uuid.uuid4().hex})
+    return f"{header}.{payload}.stub"
+
+def token_claims(token):
+    # Payload of a JWT, unverified; {} when it isn't one
+    try:
+        payload = token.split('.')[1]
+        return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return {}
+
+def _user(user_id):
+    return {
+        "id": user_id,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": "client@example.com",
+        "app_metadata": {},
+        "user_metadata": {"name": "Stub Client"},
+        "created_at": "2024-01-01T00:00:00Z"
+    }
+
+def _appointments(count=20):
+    return [{
+        "id": f"appt-{i:04d}",
+        "user_id": USER_ID,
+        "appointment_date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        "appointment_time": f"{1 + i % 12}:30 {'AM' if i % 2 else 'PM'}",
+        "status": "confirmed",
+        "reason": "video consultation request",
+        "notes": "video session requested by client",
+        "dietitian": {"name": "Dr. Stub"}
+    } for i in range(count)]
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        # gotrue sends a JSON body even on GET; leaving it unread breaks keep-alive
+        self._drain()
+        path = urlparse(self.path).path
+        claims = self._bearer_claims()
+        if claims is None:
+            self._reply({"message": "Expected exactly one Authorization: Bearer header"}, status=401)
+        elif path == "/auth/v1/user":
+            if claims.get('sub'):
+                self._reply(_user(claims['sub']))
+            else:
+                self._reply({"msg": "invalid JWT"}, status=401)
+        elif path == "/rest/v1/profiles":
+            # Like the profiles RLS policy: a user sees their own row, the anon key none
+            if claims.get('sub') == USER_ID:
+                self._reply([{"id": USER_ID, "name": "Stub Client", "role": "user", "phone": PROFILE_PHONE, "phone_verified": True}])
+            else:
+                self._reply([])
+        elif path == "/rest/v1/appointments":
+            self._reply(_appointments())
+        else:
+            self._reply([])
+
+    def do_POST(self):
+        self._drain()
+        self._reply({"Key": self.path})
+
+    def do_PATCH(self):
+        self._drain()
+        self._reply([{"id": "stub"}])
+
+    def _bearer_claims(self):
+        # Claims of the request's bearer token ({} for the anon key), or None when the
+        # header is missing or sent more than once, which PostgREST can't act on
+        values = self.headers.get_all('authorization') or []
+        if len(values) != 1 or not values[0].startswith('Bearer '):
+            return None
+        return token_claims(values[0][len('Bearer '):])
+
+    def _drain(self):
+        length = int(self.headers.get("content-length") or 0)
+        if length:
+            self.rfile.read(length)
+
+    def _reply(self, body, status=200):
+        time.sleep(self.server.latency)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class StubSupabase:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.02):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 1024
+        self.server.latency = latency
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
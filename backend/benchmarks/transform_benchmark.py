@@ -0,0 +1,110 @@
+import argparse
+import random
+import time
+from datetime import datetime
+
+from services.appointment_transformer import derived_fields, infer_type, normalize_timestamp, to_24h, transform_rows
+
+# Compares the original per-row appointment transform with the transformer
+# module on legacy rows and on rows carrying precomputed columns.
+#
+#   cd backend && python -m benchmarks.transform_benchmark --rows 100000
+
+def legacy_transform(rows):
+    # The loop get_appointments ran before the transformer module existed
+    appointments = []
+    for appointment in rows:
+        notes = appointment.get('notes') or ''
+        reason = appointment.get('reason') or ''
+        appointment_type = 'in-person'
+        if 'video' in (notes + reason).lower():
+            appointment_type = 'video'
+        elif 'phone' in (notes + reason).lower():
+            appointment_type = 'phone'
+
+        appointment_date = appointment.get('appointment_date')
+        appointment_time = appointment.get('appointment_time') or '12:00 PM'
+        try:
+            time_parts = appointment_time.split(' ')
+            time_value = time_parts[0]
+            modifier = time_parts[1] if len(time_parts) > 1 else 'AM'
+            hours, minutes = time_value.split(':')
+            hours = int(hours)
+            if hours == 12:
+                hours = 0
+            if modifier == 'PM':
+                hours += 12
+            time_24h = f"{hours:02d}:{minutes}"
+        except Exception:
+            time_24h = "12:00"
+
+        try:
+            date_obj = datetime.fromisoformat(f"{appointment_date}T{time_24h}:00")
+        except Exception:
+            date_obj = datetime.now()
+
+        appointments.append({
+            'id': appointment.get('id'),
+            'date': date_obj.isoformat(),
+            'dietitianName': appointment.get('dietitian', {}).get('name') or "Dr. Sarah Johnson",
+            'type': appointment_type,
+            'duration': 30,
+            'status': appointment.get('status') or 'pending',
+            'notes': appointment.get('reason') or ''
+        })
+    return appointments
+
+def synthetic_rows(count, seed=7):
+    rng = random.Random(seed)
+    kinds = ['video', 'phone', 'in-person']
+    rows = []
+    for i in range(count):
+        kind = rng.choice(kinds)
+        hour = rng.randint(1, 12)
+        rows.append({
+            'id': f"appt-{i}",
+            'appointment_date': f"20{rng.randint(20, 26)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'appointment_time': f"{hour}:{rng.choice(['00', '30'])} {rng.choice(['AM', 'PM'])}",
+            'status': rng.choice(['requested', 'confirmed', 'cancelled']),
+            'reason': f"{kind} consultation request",
+            'notes': f"{kind} session requested by client",
+            'dietitian': {'name': 'Dr. Bench'}
+        })
+    return rows
+
+def timed(label, func, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<34} {best * 1000:>9.1f} ms  {len(rows) / best / 1e6:>6.2f} M rows/s")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Appointment transform micro-benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    legacy_rows = synthetic_rows(args.rows)
+    precomputed_rows = [dict(row, **derived_fields(row)) for row in legacy_rows]
+
+    baseline = timed("original loop", legacy_transform, legacy_rows, args.repeat)
+
+    def cold(rows):
+        infer_type.cache_clear()
+        to_24h.cache_clear()
+        normalize_timestamp.cache_clear()
+        return transform_rows(rows)
+
+    timed("transformer, legacy rows (cold)", cold, legacy_rows, args.repeat)
+    timed("transformer, legacy rows (warm)", transform_rows, legacy_rows, args.repeat)
+    fastest = timed("transformer, precomputed rows", transform_rows, precomputed_rows, args.repeat)
+    print(f"speedup with precomputed columns: {baseline / fastest:.1f}x")
+
+    assert legacy_transform(legacy_rows[:1000]) == transform_rows(legacy_rows[:1000])
+    assert transform_rows(legacy_rows[:1000]) == transform_rows(precomputed_rows[:1000])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+import sys
+import threading
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Every endpoint spends nearly all of its time waiting on Supabase, so by default each
+# worker is a gevent loop that parks blocked requests and keeps serving the rest.
+# Set GUNICORN_WORKER_CLASS=sync to fall back to one request per worker.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+graceful_timeout = 30
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+# With GUNICORN_PRELOAD=true the master imports the app once and workers fork from it.
+# The import is light (services are built lazily), and post_fork drops anything a
+# worker inherited so that each one builds its own clients and pools.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+# Build services in the background after a worker's first response (usually the
+# readiness probe), so later requests don't pay for client setup. Waiting for that
+# response matters under gevent, where the build would otherwise hold up the loop.
+warm_services = os.environ.get('GUNICORN_WARM_SERVICES', 'true').lower() == 'true'
+
+def post_fork(server, worker):
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.reset_services()
+
+def post_request(worker, req, environ, resp):
+    if not warm_services or getattr(worker, 'services_warming', False):
+        return
+    worker.services_warming = True
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        threading.Thread(target=app_module.warm_up, name='warm-services', daemon=True).start()
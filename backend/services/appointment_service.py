@@ -1,78 +1,180 @@
 
-from datetime import datetime
+import base64
+import datetime
 import json
+import os
+import uuid
+from services.executor import fan_out
+from services.write_coalescer import WriteCoalescer
+from services.appointment_transformer import derived_fields, transform_rows, group_by_day
+from services.slot_index import SlotIndex, SlotUnavailableError, MAX_AVAILABILITY_DAYS, FREE_STATUSES, parse_time, slot_label
+
+# Only the columns the transformer reads, plus the joined dietitian name
+APPOINTMENT_COLUMNS = 'id,appointment_date,appointment_time,status,reason,notes,appointment_type,scheduled_at,' \
+                      'dietitian:profiles!dietitian_id(name)'
+# The dietitian view also needs to know whose appointment it is
+DIETITIAN_APPOINTMENT_COLUMNS = 'id,user_id,appointment_date,appointment_time,status,reason,notes,appointment_type,' \
+                                'scheduled_at,dietitian:profiles!dietitian_id(name),client:profiles!user_id(name,phone)'
+MAX_PAGE_SIZE = 200
+MAX_BATCH_UPDATES = 500
+# Extra time the first update of a batch waits for others to join it; updates
+# already batch up behind an in-flight write without it
+UPDATE_WINDOW_MS = float(os.environ.get('APPOINTMENT_UPDATE_WINDOW_MS', 0))
+NOT_FOUND = "Appointment not found"
+INVALID_ID = "Invalid appointment id"
+INVALID_TIME = "Invalid time; expected e.g. \"9:30 AM\" or \"14:30\""
+SLOT_TAKEN = "That time slot is no longer available"
+# Request fields an update may change
+UPDATE_FIELDS = ('appointment_date', 'appointment_time', 'status', 'reason', 'notes')
+# Postgres unique_violation: the slot was booked by a request this process didn't see
+UNIQUE_VIOLATION = '23505'
+
+class InvalidCursorError(ValueError):
+    pass
+
+def is_appointment_id(value):
+    # Checked before an update is queued, since Postgres rejects a whole
+    # `id in (...)` statement over one malformed uuid
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+def invalid_update(data):
+    # Error message for a change that can't be written, checked before it is queued
+    # so a bad value fails only its own request; None when it is fine
+    for key in UPDATE_FIELDS:
+        value = data.get(key)
+        if value is not None and not isinstance(value, str):
+            return f"{key} must be a string"
+    return None
+
+def encode_cursor(appointment):
+    # Opaque keyset position: the (appointment_date, id) of the last row on a page
+    raw = json.dumps([appointment.get('appointment_date'), appointment.get('id')])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        appointment_date, appointment_id = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+    # The values end up inside a PostgREST filter string, so only accept an ISO date
+    # (or null) and a UUID, re-serialized; anything else could add filter terms
+    try:
+        if appointment_date is not None:
+            appointment_date = datetime.date.fromisoformat(appointment_date).isoformat()
+        appointment_id = str(uuid.UUID(appointment_id))
+    except (TypeError, ValueError, AttributeError):
+        raise InvalidCursorError("Invalid cursor")
+    return appointment_date, appointment_id
+
+def apply_keyset(query, cursor):
+    # Rows strictly after the cursor in (appointment_date, id) order. postgrest-py 0.10
+    # has no or_(), so the PostgREST `or` parameter is added directly.
+    appointment_date, appointment_id = decode_cursor(cursor)
+    if appointment_date is None:
+        # NULL dates sort last, so only NULL-dated rows with a larger id remain
+        query.params = query.params.add('and', f"(appointment_date.is.null,id.gt.{appointment_id})")
+    else:
+        query.params = query.params.add(
+            'or',
+            f"(appointment_date.gt.{appointment_date},appointment_date.is.null,"
+            f"and(appointment_date.eq.{appointment_date},id.gt.{appointment_id}))"
+        )
+    return query
 
 class AppointmentService:
     def __init__(self, supabase_service):
         self.supabase_service = supabase_service
+        self.updates = WriteCoalescer(self._flush_updates, window=UPDATE_WINDOW_MS / 1000)
+        self.slots = SlotIndex(self._load_slot_rows)
         
-    def get_appointments(self, user_id):
+    def get_appointments(self, user_id, after=None, limit=None, date_from=None, date_to=None):
         try:
             client = self.supabase_service.get_client()
             
-            # Query appointments with joined dietitian data
-            result = client.table('appointments').select('*, dietitian:profiles!dietitian_id(name)') \
-                .eq('user_id', user_id) \
-                .order('appointment_date', {'ascending': True}) \
-                .execute()
-            
-            # Transform the data to match the expected frontend format
-            appointments = []
-            for appointment in result.data:
-                # Determine appointment type from notes or reason
-                notes = appointment.get('notes') or ''
-                reason = appointment.get('reason') or ''
-                appointment_type = 'in-person'
-                
-                if 'video' in (notes + reason).lower():
-                    appointment_type = 'video'
-                elif 'phone' in (notes + reason).lower():
-                    appointment_type = 'phone'
-                
-                # Format the appointment date
-                appointment_date = appointment.get('appointment_date')
-                appointment_time = appointment.get('appointment_time') or '12:00 PM'
-                
-                # Convert time to 24-hour format
-                try:
-                    time_parts = appointment_time.split(' ')
-                    time = time_parts[0]
-                    modifier = time_parts[1] if len(time_parts) > 1 else 'AM'
-                    
-                    hours, minutes = time.split(':')
-                    hours = int(hours)
-                    
-                    if hours == 12:
-                        hours = 0
-                        
-                    if modifier == 'PM':
-                        hours += 12
-                        
-                    time_24h = f"{hours:02d}:{minutes}"
-                except Exception:
-                    time_24h = "12:00"
-                
-                # Create date object
-                try:
-                    date_obj = datetime.fromisoformat(f"{appointment_date}T{time_24h}:00")
-                except Exception:
-                    # Fallback to current date if parsing fails
-                    date_obj = datetime.now()
-                
-                appointments.append({
-                    'id': appointment.get('id'),
-                    'date': date_obj.isoformat(),
-                    'dietitianName': appointment.get('dietitian', {}).get('name') or "Dr. Sarah Johnson",
-                    'type': appointment_type,
-                    'duration': 30,  # Hard-coded duration
-                    'status': appointment.get('status') or 'pending',
-                    'notes': appointment.get('reason') or ''
-                })
-            
-            return {"appointments": appointments}
+            # Query appointments with joined dietitian data, in keyset order
+            query = client.table('appointments').select(APPOINTMENT_COLUMNS) \
+                .eq('user_id', user_id)
+            if date_from:
+                query = query.gte('appointment_date', date_from)
+            if date_to:
+                query = query.lte('appointment_date', date_to)
+            if after:
+                query = apply_keyset(query, after)
+            # PostgREST takes a multi-column sort as one comma-separated order parameter
+            query = query.order('appointment_date,id')
+            
+            # Fetch one extra row to learn whether another page follows
+            if limit:
+                limit = min(limit, MAX_PAGE_SIZE)
+                query = query.limit(limit + 1)
+            result = query.execute()
+            
+            rows = result.data
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1])
+            
+            appointments = transform_rows(rows)
+            
+            return {"appointments": appointments, "nextCursor": next_cursor}
+        except InvalidCursorError:
+            raise
         except Exception as e:
             return {"error": str(e), "appointments": []}
             
+    def get_dietitian_appointments(self, dietitian_id, statuses=None, date_from=None, date_to=None,
+                                   after=None, limit=None):
+        # One query for a dietitian's whole schedule in a date window. The filters match
+        # the (dietitian_id, appointment_date, id) index, so cost follows the rows returned.
+        try:
+            client = self.supabase_service.get_client()
+            
+            query = client.table('appointments').select(DIETITIAN_APPOINTMENT_COLUMNS) \
+                .eq('dietitian_id', dietitian_id) \
+                .gte('appointment_date', date_from) \
+                .lte('appointment_date', date_to)
+            if statuses:
+                query = query.in_('status', statuses)
+            if after:
+                query = apply_keyset(query, after)
+            query = query.order('appointment_date,id')
+            
+            if limit:
+                limit = min(limit, MAX_PAGE_SIZE)
+                query = query.limit(limit + 1)
+            rows = query.execute().data
+            
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1])
+            
+            appointments = transform_rows(rows)
+            for appointment, row in zip(appointments, rows):
+                client_profile = row.get('client') or {}
+                appointment['clientId'] = row.get('user_id')
+                appointment['clientName'] = client_profile.get('name')
+                appointment['clientPhone'] = client_profile.get('phone')
+            
+            return {
+                "dietitianId": dietitian_id,
+                "from": date_from,
+                "to": date_to,
+                "total": len(appointments),
+                "days": group_by_day(appointments),
+                "nextCursor": next_cursor
+            }
+        except InvalidCursorError:
+            raise
+        except Exception as e:
+            return {"error": str(e), "days": []}
+    
     def create_appointment(self, data):
         try:
             client = self.supabase_service.get_client()
@@ -82,6 +184,7 @@ class AppointmentService:
             time = data.get('time')
             appointment_type = data.get('type')
             user_id = data.get('userId')
+            dietitian_id = data.get('dietitianId')
             
             if not date or not time or not user_id:
                 return {"error": "Missing required fields"}
@@ -90,6 +193,10 @@ class AppointmentService:
             if isinstance(date, str) and 'T' in date:
                 date = date.split('T')[0]
             
+            time, error = self._slot_time(time)
+            if error:
+                return {"error": error}
+            
             # Prepare data for insertion
             appointment_data = {
                 'appointment_date': date,
@@ -98,48 +205,268 @@ class AppointmentService:
                 'reason': f"{appointment_type} consultation request",
                 'notes': f"{appointment_type} session requested by client",
                 'user_id': user_id,
-                'dietitian_id': None
+                'dietitian_id': dietitian_id
             }
+            appointment_data.update(derived_fields(appointment_data))
             
-            # Insert appointment
-            result = client.table('appointments').insert(appointment_data).execute()
+            # Hold the slot until the insert settles, so concurrent requests can't both take it
+            reservation = self.slots.reserve(dietitian_id, date, time)
+            try:
+                result = client.table('appointments').insert(appointment_data).execute()
+            except Exception as e:
+                taken = getattr(e, 'code', None) == UNIQUE_VIOLATION
+                self.slots.release(reservation, taken=taken)
+                if taken:
+                    raise SlotUnavailableError(SLOT_TAKEN)
+                raise
             
             if result.data:
+                self.slots.confirm(reservation, result.data[0].get('id'))
                 return {"success": True, "appointment": result.data[0]}
             else:
+                self.slots.release(reservation)
                 return {"error": "Failed to create appointment"}
+        except SlotUnavailableError:
+            raise
+        except Exception as e:
+            return {"error": str(e)}
+    
+    def get_availability(self, dietitian_id=None, date_from=None, date_to=None):
+        # Free slots per day for one dietitian (or the unassigned clinic calendar)
+        try:
+            start = datetime.date.fromisoformat(date_from)
+            end = datetime.date.fromisoformat(date_to or date_from)
+        except (TypeError, ValueError):
+            return {"error": "from and to must be dates (YYYY-MM-DD)"}
+        if end < start:
+            return {"error": "to must not be before from"}
+        if (end - start).days >= MAX_AVAILABILITY_DAYS:
+            return {"error": f"At most {MAX_AVAILABILITY_DAYS} days per request"}
+        
+        try:
+            dates = [(start + datetime.timedelta(days=n)).isoformat() for n in range((end - start).days + 1)]
+            free = self.slots.availability(dietitian_id, dates)
+            return {
+                "dietitianId": dietitian_id,
+                "slotMinutes": self.slots.slot_minutes,
+                "days": [{"date": date, "available": free[date]} for date in dates],
+                "error": None
+            }
         except Exception as e:
             return {"error": str(e)}
+    
+    def _load_slot_rows(self, dates):
+        client = self.supabase_service.get_client()
+        return client.table('appointments') \
+            .select('id,dietitian_id,appointment_date,appointment_time,status') \
+            .in_('appointment_date', dates) \
+            .neq('status', 'cancelled') \
+            .not_.is_('dietitian_id', 'null') \
+            .execute().data or []
             
     def update_appointment(self, appointment_id, data):
+        # Goes through the coalescer, so concurrent single updates share round trips
+        if not is_appointment_id(appointment_id):
+            return {"error": INVALID_ID}
+        data, error = self._prepare_update(data or {})
+        if error:
+            return {"error": error}
+        
+        reservations, errors = self._reserve_moves([(appointment_id, data)])
+        if errors.get(appointment_id) == SLOT_TAKEN:
+            raise SlotUnavailableError(SLOT_TAKEN)
+        if errors:
+            return {"error": errors[appointment_id]}
+        result = {}
+        try:
+            result = self.updates.submit(appointment_id, data)
+        finally:
+            self._release_moves(reservations, [result])
+        if result.get('error') == SLOT_TAKEN:
+            raise SlotUnavailableError(SLOT_TAKEN)
+        if result.get('error') == NOT_FOUND:
+            cancelled = (data or {}).get('status') == 'cancelled'
+            return {"error": "Failed to cancel appointment" if cancelled else "Failed to update appointment"}
+        return result
+    
+    def update_appointments(self, updates):
+        # Bulk triage: [{id, status, ...}] -> per-item results in request order
+        results = [None] * len(updates)
+        items = []
+        positions = []
+        for index, update in enumerate(updates):
+            if not isinstance(update, dict) or not update.get('id'):
+                results[index] = {"index": index, "success": False, "error": "Appointment id is required"}
+                continue
+            if not is_appointment_id(update['id']):
+                results[index] = {"index": index, "id": update['id'], "success": False, "error": INVALID_ID}
+                continue
+            data, error = self._prepare_update({key: value for key, value in update.items() if key != 'id'})
+            if error:
+                results[index] = {"index": index, "id": update['id'], "success": False, "error": error}
+                continue
+            items.append((update['id'], data))
+            positions.append(index)
+        
+        # Moves onto a booked slot fail on their own; the rest go ahead
+        reservations, errors = self._reserve_moves(items)
+        queued = [(index, item) for index, item in zip(positions, items) if item[0] not in errors]
+        for index, (appointment_id, _) in zip(positions, items):
+            if appointment_id in errors:
+                results[index] = {"index": index, "id": appointment_id, "success": False, "error": errors[appointment_id]}
+        submitted = []
         try:
+            submitted = self.updates.submit_many([item for _, item in queued])
+        finally:
+            self._release_moves(reservations, submitted)
+        for (index, (appointment_id, _)), result in zip(queued, submitted):
+            results[index] = {"index": index, "id": appointment_id, "success": bool(result.get('success')), **result}
+        
+        updated = sum(1 for result in results if result["success"])
+        return {
+            "success": updated == len(results),
+            "updated": updated,
+            "failed": len(results) - updated,
+            "results": results
+        }
+    
+    def _slot_time(self, time):
+        # (time in the booking UI's format, None), or (None, error). One spelling per
+        # time keeps every row on the slot index and under the unique slot key.
+        minutes = parse_time(time)
+        if minutes is None:
+            return None, INVALID_TIME
+        if not self.slots.bookable(minutes):
+            return None, (f"Appointments can only be booked between "
+                          f"{slot_label(self.slots.day_start)} and {slot_label(self.slots.day_end)}")
+        return slot_label(minutes), None
+    
+    def _prepare_update(self, data):
+        # (data with the date and time normalized like create's, None), or (None, error)
+        error = invalid_update(data)
+        if error:
+            return None, error
+        if data.get('status') == 'cancelled':
+            return data, None
+        data = dict(data)
+        if 'appointment_time' in data:
+            data['appointment_time'], error = self._slot_time(data['appointment_time'])
+            if error:
+                return None, error
+        if isinstance(data.get('appointment_date'), str) and 'T' in data['appointment_date']:
+            data['appointment_date'] = data['appointment_date'].split('T')[0]
+        return data, None
+    
+    def _reserve_moves(self, items):
+        # Holds the target slot of every [(id, data)] that changes a date or time, like
+        # a create does, so two moves (or a move and a create) can't take one slot.
+        # Returns ({id: reservation}, {id: error}).
+        moving = {appointment_id: data for appointment_id, data in items
+                  if data.get('status') != 'cancelled' and ('appointment_date' in data or 'appointment_time' in data)}
+        if not moving:
+            return {}, {}
+        try:
+            # The other half of the slot (and the dietitian) come from the stored row
+            rows = self.supabase_service.get_client().table('appointments') \
+                .select('id,dietitian_id,appointment_date,appointment_time,status') \
+                .in_('id', list(moving)) \
+                .execute().data or []
+        except Exception as e:
+            return {}, {appointment_id: str(e) for appointment_id in moving}
+        
+        reservations = {}
+        errors = {}
+        for row in rows:
+            data = moving.get(row.get('id'))
+            if data is None or (data.get('status') or row.get('status')) in FREE_STATUSES:
+                continue
+            try:
+                reservations[row['id']] = self.slots.reserve(
+                    row.get('dietitian_id'),
+                    data.get('appointment_date', row.get('appointment_date')),
+                    data.get('appointment_time', row.get('appointment_time')),
+                    appointment_id=row['id']
+                )
+            except SlotUnavailableError:
+                errors[row['id']] = SLOT_TAKEN
+        return reservations, errors
+    
+    def _release_moves(self, reservations, results):
+        # Applied moves are already in the index (see _apply_group)
+        taken = any(result.get('error') == SLOT_TAKEN for result in results)
+        for reservation in reservations.values():
+            self.slots.release(reservation, taken=taken)
+    
+    def _flush_updates(self, updates):
+        # {id: merged request data} -> {id: result}. Ids whose final change is identical
+        # (e.g. a dozen confirmations) share one update ... where id in (...).
+        results = {}
+        groups = {}
+        for appointment_id, data in updates.items():
+            # The ids come from unrelated requests; a change that can't be prepared
+            # fails only its own id
+            try:
+                update_data = self._update_data(data)
+            except Exception as e:
+                results[appointment_id] = {"error": str(e)}
+                continue
+            if not update_data:
+                results[appointment_id] = {"error": "No update data provided"}
+                continue
+            key = json.dumps(update_data, sort_keys=True, default=str)
+            groups.setdefault(key, (update_data, []))[1].append(appointment_id)
+        
+        if groups:
             client = self.supabase_service.get_client()
-            
-            # Handle appointment cancellation
-            if data.get('status') == 'cancelled':
-                result = client.table('appointments').update({
-                    'status': 'cancelled'
-                }).eq('id', appointment_id).execute()
-                
-                if result.data:
-                    return {"success": True, "appointment": result.data[0]}
-                else:
-                    return {"error": "Failed to cancel appointment"}
-            
-            # Handle other updates
-            update_data = {}
-            for key in ['appointment_date', 'appointment_time', 'status', 'reason', 'notes']:
-                if key in data:
-                    update_data[key] = data[key]
-            
-            if update_data:
-                result = client.table('appointments').update(update_data).eq('id', appointment_id).execute()
-                
-                if result.data:
-                    return {"success": True, "appointment": result.data[0]}
-                else:
-                    return {"error": "Failed to update appointment"}
-            
-            return {"error": "No update data provided"}
+            # Different changes don't depend on each other, so they go out together
+            fan_out(*[
+                (lambda update_data=update_data, ids=ids: self._apply_group(client, update_data, ids, results))
+                for update_data, ids in groups.values()
+            ])
+        return results
+    
+    def _apply_group(self, client, update_data, ids, results):
+        try:
+            rows = client.table('appointments').update(update_data).in_('id', ids).execute().data or []
+            by_id = {row.get('id'): row for row in rows}
+            for appointment_id in ids:
+                row = by_id.get(appointment_id)
+                results[appointment_id] = {"success": True, "appointment": row} if row else {"error": NOT_FOUND}
+                if row:
+                    self.slots.apply(row)
         except Exception as e:
-            return {"error": str(e)}
+            if len(ids) > 1:
+                # The ids may come from unrelated requests; don't let one bad row fail
+                # the others, retry each on its own
+                for appointment_id in ids:
+                    self._apply_group(client, update_data, [appointment_id], results)
+                return
+            # The unique slot key caught a clash with a booking this process didn't see
+            results[ids[0]] = {"error": SLOT_TAKEN if getattr(e, 'code', None) == UNIQUE_VIOLATION else str(e)}
+    
+    def _update_data(self, data):
+        # Handle appointment cancellation
+        if data.get('status') == 'cancelled':
+            return {'status': 'cancelled'}
+        
+        # Handle other updates
+        update_data = {}
+        for key in UPDATE_FIELDS:
+            if key in data:
+                update_data[key] = data[key]
+        if update_data:
+            update_data.update(self._rederive(update_data))
+        return update_data
+    
+    def _rederive(self, update_data):
+        # Keep the precomputed columns in step with the fields they come from. When
+        # only part of the inputs changed, clear them so reads fall back to parsing.
+        derived = derived_fields(update_data)
+        changes = {}
+        if 'notes' in update_data or 'reason' in update_data:
+            complete = 'notes' in update_data and 'reason' in update_data
+            changes['appointment_type'] = derived['appointment_type'] if complete else None
+        if 'appointment_date' in update_data or 'appointment_time' in update_data:
+            complete = 'appointment_date' in update_data and 'appointment_time' in update_data
+            changes['scheduled_at'] = derived['scheduled_at'] if complete else None
+        return changes
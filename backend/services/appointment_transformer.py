@@ -0,0 +1,98 @@
+from datetime import datetime
+from functools import lru_cache
+
+DEFAULT_DIETITIAN_NAME = "Dr. Sarah Johnson"
+DEFAULT_TIME = "12:00 PM"
+# Hard-coded duration
+DURATION_MINUTES = 30
+
+@lru_cache(maxsize=4096)
+def infer_type(notes, reason):
+    # Determine appointment type from notes or reason
+    text = f"{notes or ''}{reason or ''}".lower()
+    if 'video' in text:
+        return 'video'
+    if 'phone' in text:
+        return 'phone'
+    return 'in-person'
+
+@lru_cache(maxsize=4096)
+def to_24h(appointment_time):
+    # Times come from a small set of slot labels, so each one is parsed only once
+    try:
+        time_parts = appointment_time.split(' ')
+        time = time_parts[0]
+        modifier = time_parts[1] if len(time_parts) > 1 else 'AM'
+
+        hours, minutes = time.split(':')
+        hours = int(hours)
+
+        if hours == 12:
+            hours = 0
+
+        if modifier == 'PM':
+            hours += 12
+
+        return f"{hours:02d}:{minutes}"
+    except Exception:
+        return "12:00"
+
+@lru_cache(maxsize=65536)
+def normalize_timestamp(appointment_date, appointment_time):
+    # Naive local timestamp of the appointment, or None when the date is unusable
+    if not appointment_date:
+        return None
+    if isinstance(appointment_date, str) and 'T' in appointment_date:
+        appointment_date = appointment_date.split('T')[0]
+    time_24h = to_24h(appointment_time or DEFAULT_TIME)
+    try:
+        return datetime.fromisoformat(f"{appointment_date}T{time_24h}:00").isoformat()
+    except Exception:
+        return None
+
+def derived_fields(appointment):
+    # Columns precomputed at write time so reads need no parsing
+    return {
+        'appointment_type': infer_type(appointment.get('notes'), appointment.get('reason')),
+        'scheduled_at': normalize_timestamp(appointment.get('appointment_date'), appointment.get('appointment_time'))
+    }
+
+def transform_rows(rows):
+    # Transform the data to match the expected frontend format
+    appointments = []
+    fallback = None
+    for appointment in rows:
+        appointment_type = appointment.get('appointment_type')
+        if appointment_type is None:
+            appointment_type = infer_type(appointment.get('notes'), appointment.get('reason'))
+
+        # Rows written before scheduled_at existed take the memoized legacy path
+        date = appointment.get('scheduled_at')
+        if date is None:
+            date = normalize_timestamp(appointment.get('appointment_date'), appointment.get('appointment_time'))
+        if date is None:
+            # Fallback to current date if parsing fails
+            fallback = fallback or datetime.now().isoformat()
+            date = fallback
+
+        appointments.append({
+            'id': appointment.get('id'),
+            'date': date,
+            'dietitianName': (appointment.get('dietitian') or {}).get('name') or DEFAULT_DIETITIAN_NAME,
+            'type': appointment_type,
+            'duration': DURATION_MINUTES,
+            'status': appointment.get('status') or 'pending',
+            'notes': appointment.get('reason') or ''
+        })
+    return appointments
+
+def group_by_day(appointments):
+    # [{date, appointments}] in day order, each day sorted by time; expects
+    # transformed appointments, whose 'date' is an ISO timestamp
+    days = {}
+    for appointment in appointments:
+        days.setdefault(appointment['date'][:10], []).append(appointment)
+    return [
+        {"date": day, "appointments": sorted(days[day], key=lambda appointment: appointment['date'])}
+        for day in sorted(days)
+    ]
@@ -1,29 +1,30 @@
 
+from services.executor import fan_out
+from services.profile_repository import ProfileRepository, to_user
+from services.session_cache import SessionCache
+
 class AuthService:
-    def __init__(self, supabase_service):
+    def __init__(self, supabase_service, profile_repository=None, session_cache=None):
         self.supabase_service = supabase_service
+        self.profiles = profile_repository or ProfileRepository(supabase_service)
+        self.session_cache = session_cache or SessionCache()
+        
+        # Any profile write makes the cached sessions for that user stale
+        self.profiles.add_listener(self.session_cache.invalidate_user)
         
     def login(self, email, password):
         try:
-            client = self.supabase_service.get_client()
-            result = client.auth.sign_in_with_password({
+            auth = self.supabase_service.create_auth_client()
+            result = auth.sign_in_with_password({
                 "email": email,
                 "password": password
             })
             
             if result.user and result.session:
-                # Get profile info
-                profile = client.table('profiles').select('*').eq('id', result.user.id).single().execute()
+                profile = self.profiles.get(result.user.id)
                 
                 return {
-                    "user": {
-                        "id": result.user.id,
-                        "email": result.user.email,
-                        "name": profile.data.get('name') if profile.data else result.user.user_metadata.get('name', 'User'),
-                        "role": profile.data.get('role') if profile.data else 'user',
-                        "phone": profile.data.get('phone'),
-                        "phoneVerified": profile.data.get('phone_verified')
-                    },
+                    "user": to_user(result.user, profile),
                     "session": {
                         "access_token": result.session.access_token,
                         "refresh_token": result.session.refresh_token,
@@ -37,25 +38,17 @@ class AuthService:
     
     def login_with_google(self, access_token):
         try:
-            client = self.supabase_service.get_client()
-            result = client.auth.sign_in_with_oauth({
+            auth = self.supabase_service.create_auth_client()
+            result = auth.sign_in_with_oauth({
                 "provider": "google",
                 "access_token": access_token
             })
             
             if result.user and result.session:
-                # Get profile info
-                profile = client.table('profiles').select('*').eq('id', result.user.id).single().execute()
+                profile = self.profiles.get(result.user.id)
                 
                 return {
-                    "user": {
-                        "id": result.user.id,
-                        "email": result.user.email,
-                        "name": profile.data.get('name') if profile.data else result.user.user_metadata.get('name', 'User'),
-                        "role": profile.data.get('role') if profile.data else 'user',
-                        "phone": profile.data.get('phone'),
-                        "phoneVerified": profile.data.get('phone_verified')
-                    },
+                    "user": to_user(result.user, profile),
                     "session": {
                         "access_token": result.session.access_token,
                         "refresh_token": result.session.refresh_token,
@@ -69,8 +62,8 @@ class AuthService:
     
     def register(self, email, password, name):
         try:
-            client = self.supabase_service.get_client()
-            result = client.auth.sign_up({
+            auth = self.supabase_service.create_auth_client()
+            result = auth.sign_up({
                 "email": email,
                 "password": password,
                 "options": {
@@ -99,30 +92,32 @@ class AuthService:
         except Exception as e:
             return {"error": str(e)}
     
-    def logout(self):
+    def logout(self, access_token=None):
         try:
-            client = self.supabase_service.get_client()
-            client.auth.sign_out()
+            # Revoke only the caller's session rather than whatever the shared client last saw
+            if access_token:
+                self.session_cache.invalidate(access_token)
+                self.supabase_service.release_token(access_token)
+                self.supabase_service.create_auth_client().admin.sign_out(access_token)
             return {"success": True}
         except Exception as e:
             return {"error": str(e)}
     
     def verify_phone(self, user_id, phone, otp, name=None):
         try:
-            client = self.supabase_service.get_client()
             formatted_phone = f"+91{phone}"
             
             # In a real application, you'd verify the OTP here
             # For this example, we'll assume OTP verification is successful
             
             # Update profile
-            result = client.table('profiles').update({
+            profile = self.profiles.update(user_id, {
                 "phone": formatted_phone,
                 "phone_verified": True,
                 "name": name
-            }).eq('id', user_id).execute()
+            })
             
-            if result.data:
+            if profile:
                 return {
                     "success": True,
                     "profile": {
@@ -137,27 +132,41 @@ class AuthService:
             return {"error": str(e)}
     
     def get_session(self, access_token):
+        # Reject bad or expired tokens locally and serve repeat polls from memory
+        claims = self.session_cache.verify(access_token)
+        if claims is None:
+            return {"session": None, "user": None}
+        
+        cached = self.session_cache.get(access_token)
+        if cached is not None:
+            return cached
+        
         try:
             client = self.supabase_service.get_client_with_token(access_token)
-            result = client.auth.get_user()
-            
+
+            # The user id is already in the token, so the profile fetch doesn't have
+            # to wait for get_user; it is only used once get_user confirms that id
+            user_id = claims.get('sub')
+            if user_id:
+                result, profile = fan_out(
+                    lambda: client.auth.get_user(access_token),
+                    lambda: self.profiles.get(user_id, client)
+                )
+            else:
+                result, profile = client.auth.get_user(access_token), None
+
             if not result.user:
                 return {"session": None, "user": None}
+
+            if result.user.id != user_id:
+                profile = self.profiles.get(result.user.id, client)
             
-            # Get profile info
-            profile = client.table('profiles').select('*').eq('id', result.user.id).single().execute()
-            
-            return {
+            session = {
                 "session": {"access_token": access_token},
-                "user": {
-                    "id": result.user.id,
-                    "email": result.user.email,
-                    "name": profile.data.get('name') if profile.data else result.user.user_metadata.get('name', 'User'),
-                    "role": profile.data.get('role') if profile.data else 'user',
-                    "phone": profile.data.get('phone'),
-                    "phoneVerified": profile.data.get('phone_verified')
-                }
+                "user": to_user(result.user, profile)
             }
+            self.session_cache.set(access_token, session, claims)
+            return session
         except Exception as e:
             print(f"Error getting session: {str(e)}")
             return {"session": None, "user": None, "error": str(e)}
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    # Thread-safe LRU cache where every entry also carries its own expiry time.
+    def __init__(self, maxsize=1024, ttl=300, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                expired = value
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+
+        self._notify_evict(key, expired)
+        return default
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        # The effective expiry is the earlier of the TTL and an absolute deadline
+        deadline = time.time() + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, deadline)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+                self.evictions += 1
+
+        for old_key, (old_value, _) in evicted:
+            self._notify_evict(old_key, old_value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[0]
+
+    def pop_where(self, predicate):
+        # Drop every live entry whose value matches, e.g. all entries for one user
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def purge_expired(self):
+        now = time.time()
+        expired = []
+        with self._lock:
+            for key, (value, expires_at) in list(self._data.items()):
+                if expires_at <= now:
+                    del self._data[key]
+                    expired.append((key, value))
+            self.expirations += len(expired)
+
+        for key, value in expired:
+            self._notify_evict(key, value)
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def _notify_evict(self, key, value):
+        if self.on_evict:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                print(f"Error in cache eviction callback: {str(e)}")
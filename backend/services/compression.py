@@ -0,0 +1,52 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    # gzip alone is offered when the brotli package isn't installed
+    brotli = None
+
+# Bodies smaller than this go out uncompressed; the framing costs more than it saves
+COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', 4))
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/csv')
+
+def choose_encoding(accept_encodings):
+    # accept_encodings is the request's parsed Accept-Encoding header
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response, accept_encodings, min_bytes=COMPRESSION_MIN_BYTES):
+    # Compresses a finished, buffered response in place when the client accepts it
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # The same entity in another encoding: keep the tag, but only as a weak match
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
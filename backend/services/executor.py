@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+# A bounded pool shared by every request for running independent upstream calls
+# side by side. Under the gevent worker, threads are patched into greenlets.
+MAX_WORKERS = int(os.environ.get('UPSTREAM_EXECUTOR_WORKERS', 32))
+DEFAULT_TIMEOUT = float(os.environ.get('UPSTREAM_CALL_TIMEOUT', 10))
+
+class UpstreamTimeoutError(Exception):
+    pass
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+def get_executor():
+    # Created lazily, and again after a fork, since pool threads don't survive one
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='upstream')
+                _executor_pid = pid
+    return _executor
+
+def fan_out(*calls, timeout=DEFAULT_TIMEOUT):
+    # Runs zero-argument callables concurrently and returns their results in order,
+    # so the wait is the slowest call rather than the sum. A call may also be given
+    # as (callable, timeout) to bound it more tightly than the group. The first
+    # failure or timeout cancels whatever has not started yet and is raised here.
+    executor = get_executor()
+    futures = []
+    limits = []
+    for call in calls:
+        call, limit = call if isinstance(call, tuple) else (call, timeout)
+        futures.append(executor.submit(call))
+        limits.append(min(t for t in (limit, timeout) if t is not None) if (limit, timeout) != (None, None) else None)
+
+    started = time.monotonic()
+    try:
+        pending = set(futures)
+        for future, limit in sorted(zip(futures, limits), key=lambda item: float('inf') if item[1] is None else item[1]):
+            remaining = None if limit is None else max(0, started + limit - time.monotonic())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_EXCEPTION)
+            failed = next((f for f in done if f.exception() is not None), None)
+            if failed is not None:
+                raise failed.exception()
+            if not future.done():
+                raise UpstreamTimeoutError(f"Upstream call did not finish within {limit}s")
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
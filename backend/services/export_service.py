@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+import os
+import zlib
+from services.executor import get_executor, DEFAULT_TIMEOUT
+from services.appointment_service import APPOINTMENT_COLUMNS, apply_keyset, encode_cursor
+from services.appointment_transformer import transform_rows
+from services.health_assessment_service import FIELD_MAP
+from services.compression import GZIP_LEVEL
+
+# Full-table exports for reporting jobs, streamed as NDJSON or CSV. Rows are read
+# one keyset page at a time, with the next page fetched while the current one is
+# written out, so memory stays at about two pages however large the table is.
+EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', 1000))
+MAX_EXPORT_PAGE_SIZE = 5000
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Assessments go out under the questionnaire's field names, as clients submit them
+ASSESSMENT_COLUMNS = 'id,created_at,' + ','.join(FIELD_MAP) + ',derived_metrics'
+ASSESSMENT_FIELDS = ['id', 'createdAt', *FIELD_MAP.values(), 'derivedMetrics']
+# Appointments in the same shape the list endpoints return, plus who they belong to
+EXPORT_APPOINTMENT_COLUMNS = f"{APPOINTMENT_COLUMNS},user_id,dietitian_id"
+APPOINTMENT_FIELDS = ['id', 'date', 'dietitianName', 'type', 'duration', 'status', 'notes', 'userId', 'dietitianId']
+
+def assessment_records(rows):
+    return [{
+        'id': row.get('id'),
+        'createdAt': row.get('created_at'),
+        **{field: row.get(column) for column, field in FIELD_MAP.items()},
+        'derivedMetrics': row.get('derived_metrics')
+    } for row in rows]
+
+def appointment_records(rows):
+    records = transform_rows(rows)
+    for record, row in zip(records, rows):
+        record['userId'] = row.get('user_id')
+        record['dietitianId'] = row.get('dietitian_id')
+    return records
+
+class _NDJSONWriter:
+    def __init__(self, fields, dumps):
+        self.dumps = dumps
+
+    def header(self):
+        return ''
+
+    def rows(self, records):
+        return ''.join(self.dumps(record) + '\n' for record in records)
+
+    def error(self, message):
+        return self.dumps({"error": message}) + '\n'
+
+class _CSVWriter:
+    def __init__(self, fields, dumps):
+        self.fields = fields
+        self.dumps = dumps
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def header(self):
+        return self._take([self.fields])
+
+    def rows(self, records):
+        # Lists and objects (meals, metrics, ...) go into one cell as JSON
+        return self._take([
+            [self.dumps(value) if isinstance(value, (list, dict)) else value
+             for value in (record.get(field) for field in self.fields)]
+            for record in records
+        ])
+
+    def error(self, message):
+        return self._take([[f"# export failed: {message}"]])
+
+    def _take(self, rows):
+        self.writer.writerows(rows)
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+class ExportService:
+    def __init__(self, supabase_service, dumps=None):
+        self.supabase_service = supabase_service
+        # The app passes its JSON encoder so exports match API responses
+        self.dumps = dumps or (lambda value: json.dumps(value, default=str))
+
+    def export_assessments(self, fmt='ndjson', user_id=None, page_size=None, gzip=False):
+        def fetch(after, limit):
+            query = self._table('health_assessments').select(ASSESSMENT_COLUMNS)
+            if user_id:
+                query = query.eq('user_id', user_id)
+            if after:
+                query = query.gt('id', after)
+            rows = query.order('id').limit(limit).execute().data or []
+            return rows, rows[-1]['id'] if rows else None
+
+        return self._export(fetch, assessment_records, ASSESSMENT_FIELDS, fmt, page_size, gzip)
+
+    def export_appointments(self, fmt='ndjson', user_id=None, dietitian_id=None, date_from=None, date_to=None,
+                            page_size=None, gzip=False):
+        def fetch(after, limit):
+            query = self._table('appointments').select(EXPORT_APPOINTMENT_COLUMNS)
+            if user_id:
+                query = query.eq('user_id', user_id)
+            if dietitian_id:
+                query = query.eq('dietitian_id', dietitian_id)
+            if date_from:
+                query = query.gte('appointment_date', date_from)
+            if date_to:
+                query = query.lte('appointment_date', date_to)
+            if after:
+                query = apply_keyset(query, after)
+            rows = query.order('appointment_date,id').limit(limit).execute().data or []
+            return rows, encode_cursor(rows[-1]) if rows else None
+
+        return self._export(fetch, appointment_records, APPOINTMENT_FIELDS, fmt, page_size, gzip)
+
+    def _table(self, name):
+        return self.supabase_service.get_client().table(name)
+
+    def _export(self, fetch, to_records, fields, fmt, page_size, gzip):
+        # Returns an iterator of byte chunks. The first page is read here, so bad
+        # parameters or an unreachable database fail before any output is sent.
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        page_size = max(1, min(page_size or EXPORT_PAGE_SIZE, MAX_EXPORT_PAGE_SIZE))
+        writer = (_CSVWriter if fmt == 'csv' else _NDJSONWriter)(fields, self.dumps)
+        first = fetch(None, page_size)
+
+        def pages():
+            rows, cursor = first
+            yield writer.header()
+            while rows:
+                # Fetch ahead while this page is encoded and sent
+                upcoming = get_executor().submit(fetch, cursor, page_size) if len(rows) == page_size else None
+                yield writer.rows(to_records(rows))
+                if upcoming is None:
+                    return
+                try:
+                    rows, cursor = upcoming.result(timeout=DEFAULT_TIMEOUT)
+                except Exception as e:
+                    # Headers are long gone; end the stream with a marker the reader can detect
+                    print(f"Error exporting page: {str(e)}")
+                    yield writer.error(str(e))
+                    return
+
+        def encoded():
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if gzip else None
+            for text in pages():
+                if not text:
+                    continue
+                data = text.encode()
+                if compressor is None:
+                    yield data
+                else:
+                    data = compressor.compress(data)
+                    if data:
+                        yield data
+            if compressor is not None:
+                yield compressor.flush()
+
+        return encoded()
@@ -1,11 +1,33 @@
 
+import io
 import os
 import time
-from pathlib import Path
+import uuid
+import hashlib
+import re
+from services.cache import TTLCache
+from services.executor import fan_out
+
+# Matches the file_size_limit of the user_uploads bucket
+MAX_UPLOAD_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 10485760))
+CHUNK_SIZE = 64 * 1024
+# Remembers where each (bucket, user, content hash) was stored
+DEDUP_INDEX_SIZE = int(os.environ.get('UPLOAD_DEDUP_INDEX_SIZE', 65536))
+DEDUP_INDEX_TTL = int(os.environ.get('UPLOAD_DEDUP_INDEX_TTL', 24 * 3600))
+SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+
+class UploadTooLargeError(Exception):
+    pass
 
 class FileService:
-    def __init__(self, supabase_service):
+    def __init__(self, supabase_service, image_pipeline=None):
         self.supabase_service = supabase_service
+        if image_pipeline is None:
+            # Imported here so Pillow is only loaded by processes that store files
+            from services.image_pipeline import ImagePipeline
+            image_pipeline = ImagePipeline()
+        self.image_pipeline = image_pipeline
+        self.content_index = TTLCache(maxsize=DEDUP_INDEX_SIZE, ttl=DEDUP_INDEX_TTL)
         
     def initialize_storage(self):
         try:
@@ -15,23 +37,25 @@ class FileService:
             buckets_result = client.storage.list_buckets()
             
             # Check if 'user_uploads' bucket exists
-            bucket_exists = any(bucket.get('name') == 'user_uploads' for bucket in buckets_result)
+            bucket_exists = any(bucket.name == 'user_uploads' for bucket in buckets_result)
             
             if not bucket_exists:
                 # Create the bucket
-                client.storage.create_bucket('user_uploads', {'public': True, 'file_size_limit': 10485760})
+                client.storage.create_bucket('user_uploads', options={'public': True, 'file_size_limit': MAX_UPLOAD_BYTES})
             
             return {"success": True, "bucket": "user_uploads"}
         except Exception as e:
             return {"error": str(e)}
     
-    def upload_file(self, bucket_id, user_id, file_path, original_filename, custom_path=None, is_public=True):
+    def upload_file(self, bucket_id, user_id, stream, original_filename, custom_path=None, is_public=True,
+                    content_type=None, content_length=None, process_images=True, content_sha256=None):
         try:
-            client = self.supabase_service.get_client()
+            if content_length is not None and content_length > MAX_UPLOAD_BYTES:
+                raise UploadTooLargeError(f"File exceeds the {MAX_UPLOAD_BYTES} byte limit")
             
-            # Create file path with user ID for organization
-            file_id = int(time.time())
-            file_ext = Path(original_filename).suffix
+            # Create file path with user ID for organization; the random id keeps
+            # uploads of the same name in the same second from overwriting each other
+            file_id = uuid.uuid4().hex
             safe_filename = original_filename.replace("/", "_").replace(" ", "_")
             
             # Use custom path or generate one
@@ -40,20 +64,185 @@ class FileService:
             else:
                 file_name = f"{user_id}/{file_id}_{safe_filename}"
             
-            # Upload file
-            with open(file_path, 'rb') as f:
-                result = client.storage.from_(bucket_id).upload(file_name, f, {'upsert': True})
+            progress = {"bytes": 0}
+            started = time.perf_counter()
+            
+            # Photos are read whole anyway, to be downscaled and re-encoded before storage
+            image = process_images and self.image_pipeline.accepts(content_type)
+            if image:
+                data = b''.join(self._read_chunks(stream, progress))
+                stream, content_length = io.BytesIO(data), len(data)
+                progress["bytes"] = 0
+            
+            # Content-addressed: when the hash is known before sending (declared by the
+            # client, or the bytes are spooled and can be read twice) a repeat upload is
+            # answered from the index. Only a hash computed here names the object; a
+            # declared one is checked while streaming, so the upload keeps its random
+            # name and can't overwrite the object stored under someone else's claim.
+            digest = (content_sha256 or '').lower() or None
+            if digest and not SHA256_HEX.match(digest):
+                digest = None
+            verified = False
+            if not custom_path and self._seekable(stream):
+                digest, verified = self._hash_stream(stream), True
+            if not custom_path and digest:
+                existing = self.content_index.get((bucket_id, user_id, digest, image))
+                if existing is not None:
+                    return self._deduplicated(existing, digest, started)
+                if verified:
+                    file_name = f"{user_id}/{digest[:32]}_{safe_filename}"
+            
+            if image:
+                result = self._upload_image(bucket_id, file_name, data)
+                if result is not None and result.get('error'):
+                    return result
+                if result is not None:
+                    result["metadata"]["sha256"] = digest
+                    result["metadata"]["durationMs"] = round((time.perf_counter() - started) * 1000, 1)
+                    if not custom_path:
+                        self._index(bucket_id, user_id, digest, image, result)
+                    return result
+            
+            # Stream the file to storage in bounded chunks, hashing as it goes
+            hasher = hashlib.sha256()
+            result = self.supabase_service.upload_object(
+                bucket_id,
+                file_name,
+                self._read_chunks(stream, progress, hasher),
+                content_type=content_type,
+                content_length=content_length
+            )
+            elapsed = time.perf_counter() - started
             
-            if 'error' in result:
-                return {"error": result['error']}
+            if result.get('error'):
+                return {"error": result['error'], "path": None, "publicUrl": None}
             
             # Get public URL if successful
-            public_url = client.storage.from_(bucket_id).get_public_url(file_name)
+            public_url = self.supabase_service.get_public_url(bucket_id, file_name)
             
-            return {
+            result = {
                 "path": file_name,
                 "publicUrl": public_url,
+                "metadata": {
+                    "bytes": progress["bytes"],
+                    "sha256": hasher.hexdigest(),
+                    "durationMs": round(elapsed * 1000, 1),
+                    "bytesPerSecond": int(progress["bytes"] / elapsed) if elapsed > 0 else None
+                },
                 "error": None
             }
+            # Indexed under the hash of what was actually sent, not what was declared
+            if not custom_path:
+                self._index(bucket_id, user_id, hasher.hexdigest(), image, result)
+            return result
+        except UploadTooLargeError:
+            raise
+        except Exception as e:
+            return {"error": str(e), "path": None, "publicUrl": None}
+    
+    def _index(self, bucket_id, user_id, digest, image, result):
+        # Scoped per bucket and user, so one user's upload never resolves to another's file
+        stored = {key: value for key, value in result.items() if key not in ('metadata', 'error')}
+        self.content_index.set((bucket_id, user_id, digest, image), stored)
+    
+    def _deduplicated(self, existing, digest, started):
+        return {
+            **existing,
+            "metadata": {
+                "bytes": 0,
+                "sha256": digest,
+                "deduplicated": True,
+                "durationMs": round((time.perf_counter() - started) * 1000, 1)
+            },
+            "error": None
+        }
+    
+    def _seekable(self, stream):
+        try:
+            return stream.seekable()
+        except (AttributeError, ValueError):
+            return False
+    
+    def _hash_stream(self, stream):
+        hasher = hashlib.sha256()
+        position = stream.tell()
+        for _ in self._read_chunks(stream, {"bytes": 0}, hasher):
+            pass
+        stream.seek(position)
+        return hasher.hexdigest()
+    
+    def _upload_image(self, bucket_id, file_name, data):
+        # Returns None when the bytes don't decode, so the original is stored as-is
+        try:
+            main, width, height, thumbnails = self.image_pipeline.process(data)
         except Exception as e:
+            print(f"Error processing image: {str(e)}")
+            return None
+        
+        stem = os.path.splitext(file_name)[0]
+        uploads = [(f"{stem}.jpg", main, None)]
+        uploads += [(f"{stem}_thumb{size}.jpg", content, size) for size, content in thumbnails]
+        
+        # The main image and thumbnails don't depend on each other, so upload them together
+        try:
+            results = fan_out(*[
+                (lambda path=path, content=content: self._upload_part(bucket_id, path, content))
+                for path, content, _ in uploads
+            ])
+        except Exception as e:
+            # Timed out: any of them may have been stored
+            self._remove_stored(bucket_id, [path for path, _, _ in uploads])
             return {"error": str(e), "path": None, "publicUrl": None}
+        errors = [result['error'] for result in results if result.get('error')]
+        if errors:
+            # Don't leave the main image or thumbnails that did make it behind
+            self._remove_stored(bucket_id, [path for (path, _, _), result in zip(uploads, results)
+                                            if not result.get('error')])
+            return {"error": errors[0], "path": None, "publicUrl": None}
+        
+        thumbnail_results = [{
+            "size": size,
+            "path": path,
+            "publicUrl": self.supabase_service.get_public_url(bucket_id, path)
+        } for path, _, size in uploads[1:]]
+        
+        return {
+            "path": uploads[0][0],
+            "publicUrl": self.supabase_service.get_public_url(bucket_id, uploads[0][0]),
+            "thumbnailUrl": thumbnail_results[0]["publicUrl"] if thumbnail_results else None,
+            "thumbnails": thumbnail_results,
+            "metadata": {
+                "bytes": len(main),
+                "originalBytes": len(data),
+                "width": width,
+                "height": height
+            },
+            "error": None
+        }
+    
+    def _upload_part(self, bucket_id, path, content):
+        try:
+            return self.supabase_service.upload_object(
+                bucket_id, path, content, content_type='image/jpeg', content_length=len(content))
+        except Exception as e:
+            return {"error": str(e)}
+    
+    def _remove_stored(self, bucket_id, paths):
+        if not paths:
+            return
+        removed = self.supabase_service.remove_objects(bucket_id, paths)
+        if removed.get('error'):
+            print(f"Error removing partial image upload: {removed['error']}")
+    
+    def _read_chunks(self, stream, progress, hasher=None):
+        # Enforce the bucket size limit while the bytes are flowing
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            progress["bytes"] += len(chunk)
+            if progress["bytes"] > MAX_UPLOAD_BYTES:
+                raise UploadTooLargeError(f"File exceeds the {MAX_UPLOAD_BYTES} byte limit")
+            if hasher is not None:
+                hasher.update(chunk)
+            yield chunk
@@ -1,53 +1,183 @@
+import os
+from services.executor import fan_out
+from services.nutrition_metrics import METRICS_VERSION, compute_metrics
+
+# health_assessments column -> field name in the questionnaire payload
+FIELD_MAP = {
+    'user_id': 'user_id',
+    'full_name': 'fullName',
+    'age': 'age',
+    'height': 'height',
+    'height_unit': 'heightUnit',
+    'weight': 'weight',
+    'weight_unit': 'weightUnit',
+    'sex': 'sex',
+    'city': 'city',
+    'health_concerns': 'healthConcerns',
+    'medical_conditions': 'medicalConditions',
+    'other_condition': 'otherCondition',
+    'diet_type': 'dietType',
+    'wakeup_time': 'wakeupTime',
+    'sleep_time': 'sleepTime',
+    'profession': 'profession',
+    'occupation': 'occupation',
+    'leave_home_time': 'leaveHomeTime',
+    'return_home_time': 'returnHomeTime',
+    'break_times': 'breakTimes',
+    'working_hours': 'workingHours',
+    'meals': 'meals',
+    'activities': 'activities',
+    'photo_urls': 'photo_urls',
+    'medical_report_urls': 'medical_report_urls'
+}
+
+# Columns that default to an empty list rather than null
+LIST_COLUMNS = ('photo_urls', 'medical_report_urls')
+
+# Everything compute_metrics reads, plus the stored result to compare against
+METRICS_COLUMNS = ('id,age,sex,height,height_unit,weight,weight_unit,wakeup_time,sleep_time,'
+                   'meals,activities,derived_metrics')
+
+DEFAULT_BATCH_CHUNK_SIZE = int(os.environ.get('HEALTH_ASSESSMENT_BATCH_CHUNK_SIZE', 500))
+MAX_BATCH_CHUNK_SIZE = 1000
+
+def metrics_or_none(row):
+    # Metrics are derived; odd answers must not stop an assessment being stored, or
+    # a recompute getting past it
+    try:
+        return compute_metrics(row)
+    except Exception as e:
+        print(f"Error computing assessment metrics: {str(e)}")
+        return None
+
+def map_assessment(data):
+    # Returns (row, error) for one questionnaire payload
+    if not isinstance(data, dict):
+        return None, "Record must be a JSON object"
+
+    if not data.get('user_id'):
+        return None, "User ID is required"
+
+    assessment_data = {column: data.get(field) for column, field in FIELD_MAP.items()}
+    for column in LIST_COLUMNS:
+        if assessment_data[column] is None:
+            assessment_data[column] = []
+    assessment_data['derived_metrics'] = metrics_or_none(assessment_data)
+    return assessment_data, None
 
 class HealthAssessmentService:
     def __init__(self, supabase_service):
         self.supabase_service = supabase_service
-        
+
     def submit_health_assessment(self, data):
         try:
             client = self.supabase_service.get_client()
-            
-            # Extract user ID and required fields
-            user_id = data.get('user_id')
-            
-            if not user_id:
-                return {"error": "User ID is required"}
-            
+
             # Prepare health assessment data
-            assessment_data = {
-                'user_id': user_id,
-                'full_name': data.get('fullName'),
-                'age': data.get('age'),
-                'height': data.get('height'),
-                'height_unit': data.get('heightUnit'),
-                'weight': data.get('weight'),
-                'weight_unit': data.get('weightUnit'),
-                'sex': data.get('sex'),
-                'city': data.get('city'),
-                'health_concerns': data.get('healthConcerns'),
-                'medical_conditions': data.get('medicalConditions'),
-                'other_condition': data.get('otherCondition'),
-                'diet_type': data.get('dietType'),
-                'wakeup_time': data.get('wakeupTime'),
-                'sleep_time': data.get('sleepTime'),
-                'profession': data.get('profession'),
-                'occupation': data.get('occupation'),
-                'leave_home_time': data.get('leaveHomeTime'),
-                'return_home_time': data.get('returnHomeTime'),
-                'break_times': data.get('breakTimes'),
-                'working_hours': data.get('workingHours'),
-                'meals': data.get('meals'),
-                'activities': data.get('activities'),
-                'photo_urls': data.get('photo_urls', []),
-                'medical_report_urls': data.get('medical_report_urls', [])
-            }
-            
+            assessment_data, error = map_assessment(data)
+            if error:
+                return {"error": error}
+
             # Insert health assessment
             result = client.table('health_assessments').insert(assessment_data).execute()
-            
+
             if result.data:
                 return {"success": True, "assessment": result.data[0]}
             else:
                 return {"error": "Failed to submit health assessment"}
         except Exception as e:
             return {"error": str(e)}
+
+    def submit_batch(self, records, chunk_size=DEFAULT_BATCH_CHUNK_SIZE):
+        # Validate and map each record, then insert valid rows one multi-row insert
+        # per chunk. `records` may be any iterable, so NDJSON can stream through.
+        # Exceptions in the iterable (e.g. unparseable lines) fail that record only.
+        chunk_size = max(1, min(chunk_size, MAX_BATCH_CHUNK_SIZE))
+        results = []
+        chunk = []
+
+        for index, record in enumerate(records):
+            if isinstance(record, Exception):
+                results.append({"index": index, "success": False, "error": str(record)})
+                continue
+
+            try:
+                assessment_data, error = map_assessment(record)
+            except Exception as e:
+                assessment_data, error = None, str(e)
+            if error:
+                results.append({"index": index, "success": False, "error": error})
+                continue
+
+            result = {"index": index, "success": False}
+            results.append(result)
+            chunk.append((result, assessment_data))
+            if len(chunk) >= chunk_size:
+                self._insert_chunk(chunk)
+                chunk = []
+
+        if chunk:
+            self._insert_chunk(chunk)
+
+        inserted = sum(1 for result in results if result["success"])
+        return {
+            "success": inserted == len(results),
+            "inserted": inserted,
+            "failed": len(results) - inserted,
+            "results": results
+        }
+
+    def recompute_metrics(self, chunk_size=DEFAULT_BATCH_CHUNK_SIZE):
+        # Recomputes derived_metrics for every stored assessment, e.g. after a formula
+        # change, paging by id. Only rows whose stored metrics differ are written, one
+        # set_health_assessment_metrics call per page, overlapped with the next read.
+        try:
+            chunk_size = max(1, min(chunk_size, MAX_BATCH_CHUNK_SIZE))
+            client = self.supabase_service.get_client()
+
+            def read_page(after):
+                query = client.table('health_assessments').select(METRICS_COLUMNS).order('id').limit(chunk_size)
+                if after is not None:
+                    query = query.gt('id', after)
+                return query.execute().data or []
+
+            def write(updates):
+                if not updates:
+                    return 0
+                return client.rpc('set_health_assessment_metrics', {'updates': updates}).execute().data or 0
+
+            scanned = updated = 0
+            rows = read_page(None)
+            while rows:
+                scanned += len(rows)
+                updates = [
+                    {"id": row['id'], "derived_metrics": metrics}
+                    for row, metrics in zip(rows, map(metrics_or_none, rows))
+                    if row.get('derived_metrics') != metrics
+                ]
+                if len(rows) < chunk_size:
+                    updated += write(updates)
+                    break
+                after = rows[-1]['id']
+                written, rows = fan_out(lambda: write(updates), lambda: read_page(after))
+                updated += written
+
+            return {"success": True, "version": METRICS_VERSION, "scanned": scanned, "updated": updated}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _insert_chunk(self, chunk):
+        try:
+            client = self.supabase_service.get_client()
+            response = client.table('health_assessments').insert([row for _, row in chunk]).execute()
+            rows = response.data or []
+
+            # PostgREST returns inserted rows in request order
+            if len(rows) != len(chunk):
+                raise Exception("Failed to submit health assessments")
+            for (result, _), row in zip(chunk, rows):
+                result["success"] = True
+                result["id"] = row.get('id')
+        except Exception as e:
+            for result, _ in chunk:
+                result["error"] = str(e)
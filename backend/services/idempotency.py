@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+import uuid
+from services.cache import TTLCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Remembers the outcome of requests sent with an Idempotency-Key so that a client
+# retrying after a timeout gets the first response back instead of a second insert.
+# A retry that arrives while the original is still running waits for it. Only
+# successful outcomes are kept; a failed attempt frees the key for another try.
+#
+# Keys are always remembered in the worker process. With IDEMPOTENCY_REDIS_URL set
+# they are also claimed and stored in Redis, so a retry that lands on another worker
+# or host is deduplicated too; without it, retries are only deduplicated when they
+# reach the same worker.
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+# Seconds a duplicate waits for the original request before giving up
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 30))
+# Seconds a claim in Redis holds without an outcome before another request may take
+# it over (the worker that made it died mid-request)
+IDEMPOTENCY_LOCK_TTL = int(os.environ.get('IDEMPOTENCY_LOCK_TTL', 300))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# Polling interval while another worker runs the original request
+SHARED_POLL_INTERVAL = 0.05
+SHARED_POLL_MAX_INTERVAL = 0.5
+
+class IdempotencyConflictError(Exception):
+    # The key was already used for a different request body
+    pass
+
+class IdempotencyInProgressError(Exception):
+    # The original request is still running after the wait timeout
+    pass
+
+class _InFlight:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.outcome = None
+        self.error = None
+        self.done = threading.Event()
+
+class RedisIdempotencyStore:
+    # Claims and outcomes shared by every worker. A claim is written with SET NX and
+    # an owner token; the outcome replaces it, or the claim is deleted when the
+    # request failed so the key can be retried.
+    RELEASE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+      return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url, prefix='idempotency:', ttl=None, lock_ttl=None, wait_timeout=None):
+        if redis is None:
+            raise RuntimeError("IDEMPOTENCY_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.release_script = self.client.register_script(self.RELEASE)
+        self.prefix = prefix
+        self.ttl = ttl or IDEMPOTENCY_KEY_TTL
+        self.lock_ttl = lock_ttl or IDEMPOTENCY_LOCK_TTL
+        self.wait_timeout = wait_timeout or IDEMPOTENCY_WAIT_TIMEOUT
+
+    def claim(self, key, fingerprint):
+        # Returns (claim, None) when this request now owns the key, or (None, outcome)
+        # when another request already completed it; waits while one is running
+        claim = json.dumps({"fingerprint": fingerprint, "owner": uuid.uuid4().hex})
+        deadline = time.monotonic() + self.wait_timeout
+        interval = SHARED_POLL_INTERVAL
+        while True:
+            if self.client.set(self.prefix + key, claim, nx=True, ex=self.lock_ttl):
+                return claim, None
+            raw = self.client.get(self.prefix + key)
+            if raw is None:
+                # Released or expired in between; try to claim it again
+                continue
+            stored = json.loads(raw)
+            if stored["fingerprint"] != fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key was already used with a different request")
+            if "status" in stored:
+                return None, (stored["payload"], stored["status"])
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgressError("A request with this Idempotency-Key is still being processed")
+            time.sleep(interval)
+            interval = min(interval * 2, SHARED_POLL_MAX_INTERVAL)
+
+    def complete(self, key, fingerprint, outcome):
+        payload, status = outcome
+        value = json.dumps({"fingerprint": fingerprint, "payload": payload, "status": status}, default=str)
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def release(self, key, claim):
+        self.release_script(keys=[self.prefix + key], args=[claim])
+
+def create_shared_store():
+    url = os.environ.get('IDEMPOTENCY_REDIS_URL')
+    return RedisIdempotencyStore(url) if url else None
+
+class IdempotencyStore:
+    def __init__(self, maxsize=None, ttl=None, wait_timeout=None, shared=None):
+        self.completed = TTLCache(maxsize=maxsize or IDEMPOTENCY_CACHE_SIZE, ttl=ttl or IDEMPOTENCY_KEY_TTL)
+        self.wait_timeout = wait_timeout or IDEMPOTENCY_WAIT_TIMEOUT
+        self.shared = shared if shared is not None else create_shared_store()
+        # Running requests are kept apart from the cache so they can't be evicted
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def run(self, key, fingerprint, compute, keep=lambda outcome: True):
+        # Returns (outcome, replayed). compute() runs at most once per key while its
+        # outcome is remembered; keep(outcome) decides whether it is remembered.
+        with self.lock:
+            stored = self.completed.get(key)
+            entry = self.in_flight.get(key) if stored is None else None
+            lead = stored is None and entry is None
+            if lead:
+                entry = self.in_flight[key] = _InFlight(fingerprint)
+
+        if stored is not None:
+            stored_fingerprint, outcome = stored
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key was already used with a different request")
+            return outcome, True
+
+        if not lead:
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key was already used with a different request")
+            if not entry.done.wait(self.wait_timeout):
+                raise IdempotencyInProgressError("A request with this Idempotency-Key is still being processed")
+            if entry.error is not None:
+                raise entry.error
+            if entry.outcome is None:
+                # The original raised; the client can retry with the same key
+                raise IdempotencyInProgressError("The original request with this Idempotency-Key failed")
+            return entry.outcome, True
+
+        claim = None
+        try:
+            claim, outcome = self._claim_shared(key, fingerprint)
+            if outcome is not None:
+                # Completed by another worker
+                self.completed.set(key, (fingerprint, outcome))
+                entry.outcome = outcome
+                return outcome, True
+
+            outcome = compute()
+            if keep(outcome):
+                self.completed.set(key, (fingerprint, outcome))
+                self._complete_shared(key, fingerprint, outcome)
+                claim = None
+            entry.outcome = outcome
+            return outcome, False
+        except (IdempotencyConflictError, IdempotencyInProgressError) as e:
+            entry.error = e
+            raise
+        finally:
+            if claim is not None:
+                self._release_shared(key, claim)
+            with self.lock:
+                self.in_flight.pop(key, None)
+            entry.done.set()
+
+    # The shared store fails open: if Redis is unreachable, requests are still
+    # deduplicated within this worker rather than rejected
+
+    def _claim_shared(self, key, fingerprint):
+        if self.shared is None:
+            return None, None
+        try:
+            return self.shared.claim(key, fingerprint)
+        except redis.RedisError as e:
+            print(f"Error claiming idempotency key: {str(e)}")
+            return None, None
+
+    def _complete_shared(self, key, fingerprint, outcome):
+        if self.shared is None:
+            return
+        try:
+            self.shared.complete(key, fingerprint, outcome)
+        except redis.RedisError as e:
+            print(f"Error storing idempotent response: {str(e)}")
+
+    def _release_shared(self, key, claim):
+        try:
+            self.shared.release(key, claim)
+        except redis.RedisError as e:
+            print(f"Error releasing idempotency key: {str(e)}")
@@ -0,0 +1,89 @@
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Pillow is optional; without it images are stored exactly as uploaded
+    Image = None
+
+# Content types we decode and re-encode; anything else passes through untouched
+PROCESSABLE_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+
+IMAGE_PROCESSING = os.environ.get('IMAGE_PROCESSING', 'true').lower() == 'true'
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2048))
+# Largest image decoded, in pixels, after the JPEG draft shrink. Only JPEGs can be
+# shrunk while decoding, so a small PNG or WebP of huge dimensions would otherwise
+# decode at full size (4 bytes a pixel) in the pool process.
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', (2 * IMAGE_MAX_DIMENSION) ** 2))
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 82))
+THUMBNAIL_SIZES = tuple(int(size) for size in os.environ.get('IMAGE_THUMBNAIL_SIZES', '160,480').split(',') if size)
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', min(4, os.cpu_count() or 1)))
+IMAGE_TIMEOUT = float(os.environ.get('IMAGE_TIMEOUT', 30))
+
+def _encode(image, quality):
+    # JPEG without the original's EXIF block (GPS, device, timestamps); Pillow only
+    # writes EXIF when it is passed explicitly
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+def process_image(data, max_dimension=IMAGE_MAX_DIMENSION, thumbnail_sizes=THUMBNAIL_SIZES, quality=IMAGE_QUALITY,
+                  max_pixels=IMAGE_MAX_PIXELS):
+    # Runs in a pool process. Returns (main JPEG, width, height, [(size, thumbnail JPEG)]).
+    with Image.open(io.BytesIO(data)) as source:
+        # Lets the JPEG decoder skip detail we're about to throw away
+        source.draft('RGB', (max_dimension, max_dimension))
+        # Only the header has been read so far; refuse before the pixels are decoded,
+        # and the caller stores the original instead
+        width, height = source.size
+        if width * height > max_pixels:
+            raise ValueError(f"Image too large to process ({width}x{height})")
+        # Bake the EXIF orientation into the pixels before the tag is dropped
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        main = _encode(image, quality)
+        width, height = image.size
+
+        thumbnails = []
+        for size in sorted(thumbnail_sizes, reverse=True):
+            # Each thumbnail is cut from the previous, larger one
+            image.thumbnail((size, size), Image.LANCZOS)
+            thumbnails.append((size, _encode(image, quality)))
+        return main, width, height, thumbnails[::-1]
+
+class ImagePipeline:
+    def __init__(self, workers=None, enabled=None):
+        self.workers = workers or IMAGE_WORKERS
+        self.enabled = (IMAGE_PROCESSING if enabled is None else enabled) and Image is not None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def accepts(self, content_type):
+        return self.enabled and (content_type or '').lower() in PROCESSABLE_TYPES
+
+    def process(self, data, timeout=IMAGE_TIMEOUT):
+        # Decoding and resizing are CPU-bound, so they run in worker processes and the
+        # request only waits on the result
+        return self._get_executor().submit(process_image, data).result(timeout=timeout)
+
+    def _get_executor(self):
+        # One pool per process; a forked worker must not reuse its parent's
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._executor_pid = pid
+        return self._executor
@@ -0,0 +1,79 @@
+from services.metrics import UpstreamTimer, bucket_label
+
+# Proxies around Supabase clients that time every network call into the upstream
+# metrics, labelled by service (postgrest/auth/storage), resource and operation
+
+QUERY_OPERATIONS = ('select', 'insert', 'update', 'upsert', 'delete')
+# Calls that only build a value locally and never reach the network
+LOCAL_OPERATIONS = ('get_public_url',)
+
+class InstrumentedQuery:
+    def __init__(self, query, table, operation='select'):
+        object.__setattr__(self, '_query', query)
+        object.__setattr__(self, '_table', table)
+        object.__setattr__(self, '_operation', operation)
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if name == 'execute':
+            def execute(*args, **kwargs):
+                with UpstreamTimer('postgrest', self._table, self._operation):
+                    return attr(*args, **kwargs)
+            return execute
+
+        if not callable(attr):
+            # e.g. the not_ property, which hands back the builder itself
+            return self._wrap(name, attr)
+
+        def call(*args, **kwargs):
+            return self._wrap(name, attr(*args, **kwargs))
+        return call
+
+    def __setattr__(self, name, value):
+        # Builders are mutated in place, e.g. `query.params = query.params.add(...)`
+        setattr(self._query, name, value)
+
+    def _wrap(self, name, result):
+        if hasattr(result, 'execute'):
+            operation = name if name in QUERY_OPERATIONS else self._operation
+            return InstrumentedQuery(result, self._table, operation)
+        return result
+
+class InstrumentedService:
+    def __init__(self, target, service, resource):
+        self._target = target
+        self._service = service
+        self._resource = resource
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == 'admin':
+            return InstrumentedService(attr, self._service, 'admin')
+        if name == 'from_':
+            return lambda bucket_id: InstrumentedService(attr(bucket_id), self._service, bucket_label(bucket_id))
+        if not callable(attr) or name in LOCAL_OPERATIONS:
+            return attr
+
+        def call(*args, **kwargs):
+            with UpstreamTimer(self._service, self._resource, name):
+                return attr(*args, **kwargs)
+        return call
+
+class InstrumentedClient:
+    def __init__(self, client):
+        self._client = client
+        self.auth = InstrumentedService(client.auth, 'auth', 'auth')
+        storage = getattr(client, 'storage', None)
+        self.storage = InstrumentedService(storage, 'storage', 'buckets') if storage is not None else None
+
+    def table(self, table_name):
+        return InstrumentedQuery(self._client.table(table_name), table_name)
+
+    def from_(self, table_name):
+        return self.table(table_name)
+
+    def rpc(self, fn, params):
+        return InstrumentedQuery(self._client.rpc(fn, params), fn, 'rpc')
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
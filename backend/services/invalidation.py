@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Cross-worker cache invalidation. Each worker keeps its own session and profile
+# caches, so a write handled by one worker leaves the others serving the old
+# value until their TTL runs out. With CACHE_INVALIDATION_REDIS_URL set, every
+# invalidation is also published on a Redis channel and applied by all other
+# workers and hosts; without it the channel does nothing and the caches' (short)
+# default TTLs bound the staleness.
+INVALIDATION_REDIS_URL = os.environ.get('CACHE_INVALIDATION_REDIS_URL')
+# Seconds between reconnect attempts after the subscription drops
+RECONNECT_DELAY = 1.0
+
+class InvalidationChannel:
+    def __init__(self, name, url=None):
+        self.name = f"invalidate:{name}"
+        # Messages carry the sender's id so a worker skips its own; it has already
+        # applied the change locally
+        self.origin = uuid.uuid4().hex
+        self.url = INVALIDATION_REDIS_URL if url is None else url
+        self.callbacks = []
+        self.client = None
+        self.thread = None
+        self.lock = threading.Lock()
+        if self.url:
+            if redis is None:
+                raise RuntimeError("CACHE_INVALIDATION_REDIS_URL is set but the redis package is not installed")
+            self.client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    @property
+    def shared(self):
+        return self.client is not None
+
+    def subscribe(self, callback):
+        # callback(key) runs for every key another worker publishes, and with None
+        # after the subscription was interrupted (messages may have been missed, so
+        # the subscriber should drop everything)
+        self.callbacks.append(callback)
+        if self.client is None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._listen, name=self.name, daemon=True)
+                self.thread.start()
+
+    def publish(self, key):
+        if self.client is None:
+            return
+        try:
+            self.client.publish(self.name, f"{self.origin} {key}")
+        except redis.RedisError as e:
+            # The other workers catch up when their entries expire
+            print(f"Error publishing cache invalidation: {str(e)}")
+
+    def _listen(self):
+        # A separate connection without a read timeout: listen() blocks between messages
+        client = redis.Redis.from_url(self.url, socket_connect_timeout=0.5, health_check_interval=30)
+        interrupted = False
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.name)
+                if interrupted:
+                    self._deliver(None)
+                    interrupted = False
+                for message in pubsub.listen():
+                    origin, _, key = message['data'].decode().partition(' ')
+                    if origin != self.origin:
+                        self._deliver(key)
+            except redis.RedisError as e:
+                print(f"Error in cache invalidation subscription: {str(e)}")
+                interrupted = True
+                time.sleep(RECONNECT_DELAY)
+
+    def _deliver(self, key):
+        for callback in self.callbacks:
+            try:
+                callback(key)
+            except Exception as e:
+                print(f"Error applying cache invalidation: {str(e)}")
@@ -0,0 +1,43 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    # Without orjson, Flask's stdlib-based provider is used unchanged
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Flask JSON provider backed by orjson. datetime, date and UUID values are
+    # written natively (datetimes as ISO 8601), so services can return them as-is;
+    # anything else orjson doesn't know goes through Flask's default().
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj, indent=bool(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Bytes straight into the response, skipping the str round trip
+        return self._app.response_class(self._encode(obj, indent) + b"\n", mimetype=self.mimetype)
+
+    def _encode(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except orjson.JSONEncodeError:
+            # orjson refuses integers beyond 64 bits; the stdlib encoder writes them
+            # exactly (and raises the same TypeError as before for unknown types)
+            return super().dumps(obj, indent=2 if indent else None).encode()
@@ -0,0 +1,44 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+def _b64decode(segment):
+    padding = '=' * (-len(segment) % 4)
+    return base64.urlsafe_b64decode(segment + padding)
+
+def decode_claims(token):
+    # Read the JWT payload without verifying the signature
+    try:
+        payload = token.split('.')[1]
+        return json.loads(_b64decode(payload))
+    except Exception:
+        return {}
+
+def get_expiry(token):
+    exp = decode_claims(token).get('exp')
+    try:
+        return float(exp) if exp is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def verify_token(token, secret, leeway=0):
+    # Check an HS256 signature and the exp claim; returns the claims or None
+    try:
+        header_segment, payload_segment, signature_segment = token.split('.')
+        header = json.loads(_b64decode(header_segment))
+        if header.get('alg') != 'HS256':
+            return None
+
+        signing_input = f"{header_segment}.{payload_segment}".encode()
+        expected = hmac.new(secret.encode(), signing_input, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_segment)):
+            return None
+
+        claims = json.loads(_b64decode(payload_segment))
+        if float(claims['exp']) + leeway <= time.time():
+            return None
+        return claims
+    except Exception:
+        return None
@@ -0,0 +1,46 @@
+import os
+import threading
+
+# Module-level stand-in for a service that is built on first use, once per process.
+# Attribute access is forwarded to the real object, so call sites don't change.
+# The owning pid is remembered: a worker forked from a process that already built
+# the service builds its own instead of sharing clients, pools and locks across
+# the fork.
+
+class LazyService:
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'service')
+        self._instance = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        instance, pid = self._instance, self._pid
+        if instance is not None and pid == os.getpid():
+            return instance
+        with self._lock:
+            if self._instance is None or self._pid != os.getpid():
+                self._instance = self._factory()
+                self._pid = os.getpid()
+            return self._instance
+
+    def reset(self):
+        # Forget the instance, e.g. in a freshly forked worker; the next use rebuilds it
+        self._lock = threading.Lock()
+        self._instance = None
+        self._pid = None
+
+    @property
+    def initialized(self):
+        return self._instance is not None and self._pid == os.getpid()
+
+    def __getattr__(self, name):
+        # Only reached for names not defined on the proxy itself
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        state = 'ready' if self.initialized else 'not built'
+        return f"<LazyService {self._name} ({state})>"
@@ -0,0 +1,653 @@
+import base64
+import copy
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from services.jwt_utils import verify_token
+
+# An in-process stand-in for the parts of Supabase this backend uses: PostgREST
+# table queries, GoTrue auth and Storage uploads. Selected with SUPABASE_BACKEND=memory
+# for offline development and benchmarks; data lives only as long as the process.
+
+DEFAULT_JWT_SECRET = "memory-backend-secret"
+
+class MemoryAPIError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def _split_top_level(text, separator=','):
+    # Split on separators that are not nested inside parentheses
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == separator and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if current:
+        parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+def _comparable(value):
+    # Compare numbers numerically and everything else as text
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+def _compare(left, right):
+    left, right = _comparable(left), _comparable(right)
+    if type(left) is not type(right):
+        left, right = str(left), str(right)
+    return (left > right) - (left < right)
+
+def _parse_condition(column, expression):
+    # One PostgREST filter, e.g. ("status", "in.(a,b)") or ("or", "(x.eq.1,y.gt.2)")
+    negate = False
+    if expression.startswith('not.'):
+        negate, expression = True, expression[4:]
+
+    if column in ('or', 'and'):
+        terms = [_parse_term(term) for term in _split_top_level(expression[1:-1])]
+        combine = any if column == 'or' else all
+        predicate = lambda row: combine(term(row) for term in terms)
+    else:
+        operator, _, value = expression.partition('.')
+        predicate = _operator(column, operator, value)
+
+    return (lambda row: not predicate(row)) if negate else predicate
+
+def _parse_term(term):
+    # A term inside or()/and(): "col.op.value", "and(...)" or "or(...)"
+    match = re.match(r'^(not\.)?(and|or)(\(.*\))$', term)
+    if match:
+        return _parse_condition(match.group(2), (match.group(1) or '') + match.group(3))
+    column, _, expression = term.partition('.')
+    return _parse_condition(column, expression)
+
+def _operator(column, operator, value):
+    if operator == 'eq':
+        return lambda row: row.get(column) is not None and _compare(row.get(column), value) == 0
+    if operator == 'neq':
+        return lambda row: row.get(column) is not None and _compare(row.get(column), value) != 0
+    if operator in ('gt', 'gte', 'lt', 'lte'):
+        accept = {'gt': (1,), 'gte': (0, 1), 'lt': (-1,), 'lte': (-1, 0)}[operator]
+        return lambda row: row.get(column) is not None and _compare(row.get(column), value) in accept
+    if operator == 'is':
+        expected = {'null': None, 'true': True, 'false': False}[value]
+        return lambda row: row.get(column) is expected
+    if operator == 'in':
+        values = {str(item).strip('"') for item in _split_top_level(value[1:-1])}
+        return lambda row: row.get(column) is not None and str(row.get(column)) in values
+    raise MemoryAPIError(f"Unsupported filter operator: {operator}")
+
+def _format_value(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+class _Params:
+    # Mimics the httpx QueryParams.add() that callers use for raw PostgREST params
+    def __init__(self, query):
+        self.query = query
+
+    def add(self, key, value):
+        self.query._add_param(key, value)
+        return self
+
+class MemoryTable:
+    def __init__(self, name):
+        self.name = name
+        self.rows = []
+        self.by_id = {}
+        # column -> {comparable value -> {id(row): row}}; built on the first eq filter
+        # on a column and kept current by every write, like a btree on that column
+        self.indexes = {}
+
+    def index(self, column):
+        index = self.indexes.get(column)
+        if index is None:
+            index = self.indexes[column] = {}
+            for row in self.rows:
+                self._index_add(column, index, row)
+        return index
+
+    def add(self, row):
+        self.rows.append(row)
+        self.by_id[row['id']] = row
+        for column, index in self.indexes.items():
+            self._index_add(column, index, row)
+
+    def update(self, row, values):
+        for column, index in self.indexes.items():
+            if column in values:
+                self._index_remove(column, index, row)
+        row.update(values)
+        for column, index in self.indexes.items():
+            if column in values:
+                self._index_add(column, index, row)
+
+    def remove(self, rows):
+        doomed = {id(row) for row in rows}
+        self.rows = [row for row in self.rows if id(row) not in doomed]
+        for row in rows:
+            self.by_id.pop(row.get('id'), None)
+            for column, index in self.indexes.items():
+                self._index_remove(column, index, row)
+
+    def _index_add(self, column, index, row):
+        if row.get(column) is not None:
+            index.setdefault(_comparable(row[column]), {})[id(row)] = row
+
+    def _index_remove(self, column, index, row):
+        if row.get(column) is not None:
+            bucket = index.get(_comparable(row[column]), {})
+            bucket.pop(id(row), None)
+            if not bucket:
+                index.pop(_comparable(row[column]), None)
+
+class MemoryQuery:
+    def __init__(self, backend, table):
+        self.backend = backend
+        self.table = table
+        self.method = 'select'
+        self.columns = '*'
+        self.payload = None
+        self.upsert_conflict = None
+        self.filters = []
+        # Plain top-level eq filters, which can be answered from a column index
+        self.equalities = []
+        self.ordering = []
+        self.row_limit = None
+        self.single_mode = None
+        self.negate_next = False
+
+    # Request methods
+
+    def select(self, *columns, count=None):
+        self.columns = ','.join(columns) or '*'
+        return self
+
+    def insert(self, json, returning=None, **kwargs):
+        self.method, self.payload = 'insert', json
+        return self
+
+    def upsert(self, json, on_conflict='id', returning=None, **kwargs):
+        self.method, self.payload, self.upsert_conflict = 'upsert', json, on_conflict or 'id'
+        return self
+
+    def update(self, json, **kwargs):
+        self.method, self.payload = 'update', json
+        return self
+
+    def delete(self, **kwargs):
+        self.method = 'delete'
+        return self
+
+    # Filters
+
+    @property
+    def not_(self):
+        self.negate_next = True
+        return self
+
+    @property
+    def params(self):
+        return _Params(self)
+
+    @params.setter
+    def params(self, value):
+        # Filters are recorded as they are added, so reassignment is a no-op
+        pass
+
+    def filter(self, column, operator, criteria):
+        return self._add_param(column, f"{operator}.{criteria}")
+
+    def eq(self, column, value):
+        return self.filter(column, 'eq', _format_value(value))
+
+    def neq(self, column, value):
+        return self.filter(column, 'neq', _format_value(value))
+
+    def gt(self, column, value):
+        return self.filter(column, 'gt', _format_value(value))
+
+    def gte(self, column, value):
+        return self.filter(column, 'gte', _format_value(value))
+
+    def lt(self, column, value):
+        return self.filter(column, 'lt', _format_value(value))
+
+    def lte(self, column, value):
+        return self.filter(column, 'lte', _format_value(value))
+
+    def is_(self, column, value):
+        return self.filter(column, 'is', _format_value(value))
+
+    def in_(self, column, values):
+        return self.filter(column, 'in', f"({','.join(_format_value(v) for v in values)})")
+
+    def match(self, query):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def order(self, column, *, desc=False, nullsfirst=False, foreign_table=None):
+        for name in column.split(','):
+            self.ordering.append((name.strip(), desc, nullsfirst))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        self.row_limit = size
+        return self
+
+    def single(self):
+        self.single_mode = 'single'
+        return self
+
+    def maybe_single(self):
+        self.single_mode = 'maybe'
+        return self
+
+    def _add_param(self, key, value):
+        if key in ('select', 'order', 'limit'):
+            return self
+        if self.negate_next:
+            self.negate_next = False
+            value = f"not.{value}"
+        elif key not in ('or', 'and') and value.startswith('eq.'):
+            self.equalities.append((key, value[3:]))
+        self.filters.append(_parse_condition(key, value))
+        return self
+
+    # Execution
+
+    def execute(self):
+        data = self.backend.run(self)
+        if self.single_mode:
+            if len(data) > 1 or (self.single_mode == 'single' and not data):
+                raise MemoryAPIError("JSON object requested, multiple (or no) rows returned", code='PGRST116')
+            data = data[0] if data else None
+        return SimpleNamespace(data=data, count=None)
+
+class MemoryTableClient:
+    # What client.table()/from_() hand back; also mimics client.postgrest
+    def __init__(self, backend):
+        self.backend = backend
+
+    def table(self, table_name):
+        return MemoryQuery(self.backend, table_name)
+
+    def from_(self, table_name):
+        return self.table(table_name)
+
+class MemoryRpc:
+    # What client.rpc() hands back; the function runs on execute()
+    def __init__(self, backend, fn, params):
+        self.backend = backend
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        return SimpleNamespace(data=self.backend.call(self.fn, self.params), count=None)
+
+class MemoryAuth:
+    def __init__(self, backend):
+        self.backend = backend
+        self.admin = SimpleNamespace(sign_out=backend.sign_out)
+
+    def sign_in_with_password(self, credentials):
+        return self.backend.sign_in(credentials.get('email'), credentials.get('password'))
+
+    def sign_in_with_oauth(self, credentials):
+        return self.backend.sign_in_oauth(credentials.get('provider'), credentials.get('access_token'))
+
+    def sign_up(self, credentials):
+        options = credentials.get('options') or {}
+        return self.backend.sign_up(credentials.get('email'), credentials.get('password'), options.get('data') or {})
+
+    def sign_out(self):
+        return None
+
+    def get_user(self, jwt=None):
+        return self.backend.get_user(jwt)
+
+class MemoryBucket:
+    def __init__(self, backend, bucket_id):
+        self.backend = backend
+        self.bucket_id = bucket_id
+
+    def upload(self, path, file, file_options=None):
+        content = file.read() if hasattr(file, 'read') else file
+        return self.backend.put_object(self.bucket_id, path, [content])
+
+    def get_public_url(self, path, options=None):
+        return self.backend.public_url(self.bucket_id, path)
+
+    def download(self, path):
+        return self.backend.get_object(self.bucket_id, path)
+
+class MemoryStorage:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def list_buckets(self):
+        with self.backend.lock:
+            return [SimpleNamespace(**bucket) for bucket in self.backend.buckets.values()]
+
+    def create_bucket(self, id, name=None, options=None):
+        return self.backend.create_bucket(id, name, options)
+
+    def from_(self, bucket_id):
+        return MemoryBucket(self.backend, bucket_id)
+
+class MemoryClient:
+    def __init__(self, backend):
+        self.backend = backend
+        self.postgrest = MemoryTableClient(backend)
+        self.auth = MemoryAuth(backend)
+        self.storage = MemoryStorage(backend)
+
+    def table(self, table_name):
+        return self.postgrest.table(table_name)
+
+    def from_(self, table_name):
+        return self.table(table_name)
+
+    def rpc(self, fn, params):
+        return MemoryRpc(self.backend, fn, params)
+
+class MemoryBackend:
+    def __init__(self, jwt_secret=None, base_url="http://memory.supabase.local"):
+        self.jwt_secret = jwt_secret or os.environ.get('SUPABASE_JWT_SECRET') or DEFAULT_JWT_SECRET
+        self.base_url = base_url
+        self.lock = threading.RLock()
+        # Off makes every query a full scan, for comparison in benchmarks
+        self.use_indexes = True
+        self.tables = {}
+        self.users = {}
+        self.users_by_email = {}
+        self.revoked = set()
+        self.buckets = {}
+        self.objects = {}
+
+    def client(self):
+        return MemoryClient(self)
+
+    # Tables
+
+    def _table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = MemoryTable(name)
+        return table
+
+    def run(self, query):
+        with self.lock:
+            table = self._table(query.table)
+            if query.method == 'insert':
+                return self._insert(table, query.payload)
+            if query.method == 'upsert':
+                return self._upsert(table, query.payload, query.upsert_conflict)
+
+            rows = [row for row in self._candidates(table, query) if all(check(row) for check in query.filters)]
+            if query.method == 'update':
+                return self._update(table, rows, query.payload)
+            if query.method == 'delete':
+                return self._delete(table, rows)
+
+            rows = self._sort(rows, query.ordering)
+            if query.row_limit is not None:
+                rows = rows[:query.row_limit]
+            return [self._project(row, query.columns) for row in rows]
+
+    # Database functions from supabase/migrations, reimplemented over the tables
+
+    def call(self, fn, params):
+        handler = getattr(self, f"_rpc_{fn}", None)
+        if handler is None:
+            raise MemoryAPIError(f"Could not find the function public.{fn}", code='PGRST202')
+        with self.lock:
+            return handler(**params)
+
+    def _rpc_set_health_assessment_metrics(self, updates):
+        table = self._table('health_assessments')
+        updated = 0
+        for update in updates:
+            row = table.by_id.get(update['id'])
+            if row is not None:
+                table.update(row, {'derived_metrics': copy.deepcopy(update['derived_metrics'])})
+                updated += 1
+        return updated
+
+    def _insert(self, table, payload):
+        inserted = []
+        for values in payload if isinstance(payload, list) else [payload]:
+            row = copy.deepcopy(values)
+            row.setdefault('id', str(uuid.uuid4()))
+            if row['id'] in table.by_id:
+                raise MemoryAPIError(f"duplicate key value violates unique constraint \"{table.name}_pkey\"", code='23505')
+            row.setdefault('created_at', _now())
+            row.setdefault('updated_at', row['created_at'])
+            table.add(row)
+            inserted.append(copy.deepcopy(row))
+        return inserted
+
+    def _upsert(self, table, payload, conflict):
+        results = []
+        for values in payload if isinstance(payload, list) else [payload]:
+            existing = next((row for row in table.rows if row.get(conflict) == values.get(conflict)), None)
+            if existing is None:
+                results.extend(self._insert(table, values))
+            else:
+                results.extend(self._update(table, [existing], values))
+        return results
+
+    def _update(self, table, rows, values):
+        updated = []
+        for row in rows:
+            table.update(row, {**copy.deepcopy(values), 'updated_at': _now()})
+            updated.append(copy.deepcopy(row))
+        return updated
+
+    def _delete(self, table, rows):
+        table.remove(rows)
+        return [copy.deepcopy(row) for row in rows]
+
+    def _candidates(self, table, query):
+        # The smallest index bucket among the eq filters; every filter is still
+        # checked on the candidates, so this only narrows the scan
+        candidates = table.rows
+        if not self.use_indexes:
+            return candidates
+        for column, value in query.equalities:
+            if column == 'id':
+                row = table.by_id.get(value)
+                bucket = [row] if row is not None else []
+            else:
+                bucket = list(table.index(column).get(_comparable(value), {}).values())
+            if len(bucket) < len(candidates):
+                candidates = bucket
+        return candidates
+
+    def _sort(self, rows, ordering):
+        # Stable multi-key sort, applied from the last key to the first; NULLs sort
+        # last ascending and first descending unless nullsfirst says otherwise
+        rows = list(rows)
+        for column, desc, nullsfirst in reversed(ordering):
+            present = [row for row in rows if row.get(column) is not None]
+            missing = [row for row in rows if row.get(column) is None]
+            present.sort(key=lambda row: _comparable(row.get(column)), reverse=desc)
+            nulls_first = nullsfirst or desc
+            rows = missing + present if nulls_first else present + missing
+        return rows
+
+    def _project(self, row, columns):
+        result = {}
+        for column in _split_top_level(columns):
+            if column == '*':
+                result.update(copy.deepcopy(row))
+                continue
+
+            # Embedded resource: alias:table!fk_column(columns)
+            match = re.match(r'^(?:(\w+):)?(\w+)(?:!(\w+))?\((.*)\)$', column)
+            if match:
+                alias, table_name, fk, inner = match.groups()
+                target = self._table(table_name).by_id.get(row.get(fk or f"{table_name}_id"))
+                result[alias or table_name] = self._project(target, inner) if target else None
+                continue
+
+            result[column] = copy.deepcopy(row.get(column))
+        return result
+
+    # Auth
+
+    def _issue_session(self, user):
+        now = int(time.time())
+        header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+        payload = _b64encode(json.dumps({
+            "sub": user.id,
+            "email": user.email,
+            "role": "authenticated",
+            "iat": now,
+            "exp": now + 3600,
+            "jti": uuid.uuid4().hex
+        }).encode())
+        signature = hmac.new(self.jwt_secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        return SimpleNamespace(
+            access_token=f"{header}.{payload}.{_b64encode(signature)}",
+            refresh_token=uuid.uuid4().hex,
+            expires_at=now + 3600,
+            token_type="bearer"
+        )
+
+    def _create_user(self, email, password, metadata):
+        user = SimpleNamespace(id=str(uuid.uuid4()), email=email, user_metadata=dict(metadata), app_metadata={})
+        self.users[user.id] = (user, password)
+        self.users_by_email[email] = user.id
+        # Mirrors the handle_new_user trigger that creates a profile per sign-up
+        self._insert(self._table('profiles'), {
+            "id": user.id,
+            "name": metadata.get('name'),
+            "role": "user",
+            "phone": None,
+            "phone_verified": False
+        })
+        return user
+
+    def add_user(self, email, password, name=None, role='user'):
+        with self.lock:
+            user = self._create_user(email, password, {"name": name})
+            profiles = self._table('profiles')
+            profiles.update(profiles.by_id[user.id], {'role': role})
+            return user
+
+    def sign_up(self, email, password, metadata):
+        with self.lock:
+            if email in self.users_by_email:
+                raise MemoryAPIError("User already registered")
+            user = self._create_user(email, password, metadata)
+            return SimpleNamespace(user=user, session=self._issue_session(user))
+
+    def sign_in(self, email, password):
+        with self.lock:
+            user_id = self.users_by_email.get(email)
+            if user_id is None or self.users[user_id][1] != password:
+                raise MemoryAPIError("Invalid login credentials")
+            user = self.users[user_id][0]
+            return SimpleNamespace(user=user, session=self._issue_session(user))
+
+    def sign_in_oauth(self, provider, access_token):
+        # Any provider token maps to a stable user, created on first sight
+        email = f"{hashlib.sha256(f'{provider}:{access_token}'.encode()).hexdigest()[:16]}@{provider}.oauth"
+        with self.lock:
+            user_id = self.users_by_email.get(email)
+            user = self.users[user_id][0] if user_id else self._create_user(email, None, {"name": "User"})
+            return SimpleNamespace(user=user, session=self._issue_session(user))
+
+    def get_user(self, jwt):
+        claims = verify_token(jwt or '', self.jwt_secret)
+        if claims is None or claims.get('jti') in self.revoked:
+            raise MemoryAPIError("Invalid JWT")
+        with self.lock:
+            entry = self.users.get(claims['sub'])
+        if entry is None:
+            raise MemoryAPIError("User not found")
+        return SimpleNamespace(user=entry[0])
+
+    def sign_out(self, jwt):
+        claims = verify_token(jwt or '', self.jwt_secret)
+        if claims:
+            self.revoked.add(claims.get('jti'))
+
+    # Storage
+
+    def create_bucket(self, bucket_id, name=None, options=None):
+        options = options or {}
+        with self.lock:
+            if bucket_id in self.buckets:
+                raise MemoryAPIError("The resource already exists")
+            self.buckets[bucket_id] = {
+                "id": bucket_id,
+                "name": name or bucket_id,
+                "public": options.get('public', False),
+                "file_size_limit": options.get('file_size_limit')
+            }
+            self.objects[bucket_id] = {}
+        return {"name": bucket_id}
+
+    def put_object(self, bucket_id, path, chunks, upsert=True):
+        content = b''.join(chunks)
+        with self.lock:
+            bucket = self.buckets.get(bucket_id)
+            if bucket is None:
+                return {"error": "Bucket not found"}
+            limit = bucket.get('file_size_limit')
+            if limit and len(content) > limit:
+                return {"error": "Payload too large"}
+            if not upsert and path in self.objects[bucket_id]:
+                return {"error": "The resource already exists"}
+            self.objects[bucket_id][path] = content
+        return {"error": None}
+
+    def remove_objects(self, bucket_id, paths):
+        with self.lock:
+            bucket = self.objects.get(bucket_id)
+            if bucket is None:
+                return {"error": "Bucket not found"}
+            for path in paths:
+                bucket.pop(path, None)
+        return {"error": None}
+
+    def get_object(self, bucket_id, path):
+        with self.lock:
+            return self.objects.get(bucket_id, {}).get(path)
+
+    def public_url(self, bucket_id, path):
+        return f"{self.base_url}/storage/v1/object/public/{bucket_id}/{path}"
@@ -0,0 +1,205 @@
+import bisect
+import threading
+import time
+
+# A small Prometheus-compatible metrics registry. Each metric keeps one value per
+# label tuple behind its own lock, so recording is a dict lookup and an add.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labels, values), value) for values, value in items]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then count and sum
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(values, (list(state[0]), state[1], state[2])) for values, state in self._values.items()]
+
+        lines = []
+        for values, (counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, values, f'le="{_format_number(float(bound))}"')
+                lines.append((f"{self.name}_bucket", labels, cumulative))
+            lines.append((f"{self.name}_count", _format_labels(self.labels, values), count))
+            lines.append((f"{self.name}_sum", _format_labels(self.labels, values), total))
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def register_collector(self, collector):
+        # `collector()` returns (name, kind, help, [(label dict, value)]) tuples at scrape time
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_number(value)}")
+
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = _format_labels(labels.keys(), labels.values())
+                    lines.append(f"{name}{label_text} {_format_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests', ('method', 'route', 'status'))
+http_requests_in_flight = registry.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled', ('route',))
+http_request_errors = registry.counter(
+    'http_request_errors_total', 'HTTP requests answered with a 4xx/5xx status or an exception', ('route', 'status'))
+
+upstream_duration = registry.histogram(
+    'supabase_request_duration_seconds', 'Time spent in Supabase calls', ('service', 'resource', 'operation'))
+upstream_in_flight = registry.gauge(
+    'supabase_requests_in_flight', 'Supabase calls currently waiting on a response', ('service',))
+upstream_errors = registry.counter(
+    'supabase_request_errors_total', 'Supabase calls that raised or returned an error', ('service', 'resource', 'operation'))
+
+class UpstreamTimer:
+    # Times one upstream call: `with UpstreamTimer('postgrest', 'profiles', 'select'): ...`
+    __slots__ = ('service', 'resource', 'operation', 'started')
+
+    def __init__(self, service, resource, operation):
+        self.service = service
+        self.resource = resource
+        self.operation = operation
+
+    def __enter__(self):
+        upstream_in_flight.inc(self.service)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        upstream_in_flight.dec(self.service)
+        upstream_duration.observe(self.service, self.resource, self.operation, value=elapsed)
+        if exc_type is not None:
+            upstream_errors.inc(self.service, self.resource, self.operation)
+        return False
+
+def record_upstream_error(service, resource, operation):
+    upstream_errors.inc(service, resource, operation)
+
+# Bucket ids come from the request, so only buckets this app creates get their own
+# series; anything else is counted as 'other' to keep the label set bounded
+STORAGE_BUCKETS = ('user_uploads',)
+
+def bucket_label(bucket_id):
+    return bucket_id if bucket_id in STORAGE_BUCKETS else 'other'
+
+def cache_collector(caches):
+    # Exposes TTLCache.stats() at scrape time for a {name: cache} mapping, or a
+    # callable returning one when the caches are created later
+    families = (
+        ('cache_hits_total', 'counter', 'Cache lookups that found a live entry', 'hits'),
+        ('cache_misses_total', 'counter', 'Cache lookups that found nothing or an expired entry', 'misses'),
+        ('cache_evictions_total', 'counter', 'Entries dropped to stay within the size bound', 'evictions'),
+        ('cache_expirations_total', 'counter', 'Entries dropped because their TTL passed', 'expirations'),
+        ('cache_entries', 'gauge', 'Entries currently held', 'size'),
+    )
+
+    def collect():
+        current = caches() if callable(caches) else caches
+        stats = {name: cache.stats() for name, cache in current.items()}
+        return [
+            (metric, kind, help_text, [({"cache": name}, values[key]) for name, values in stats.items()])
+            for metric, kind, help_text, key in families
+        ]
+    return collect
@@ -0,0 +1,180 @@
+import math
+import re
+from functools import lru_cache
+
+# Derived metrics for a health assessment row: normalized height and weight, BMI,
+# BMR/TDEE estimates and the daily meal schedule. Computed once when an assessment
+# is stored (health_assessments.derived_metrics) so dashboards don't re-derive them
+# per read. Bump METRICS_VERSION whenever a formula changes; the batch recompute
+# rewrites every row whose stored metrics differ.
+METRICS_VERSION = 1
+
+KG_PER_LB = 0.45359237
+CM_PER_INCH = 2.54
+# Values outside these ranges are treated as typos rather than measurements
+HEIGHT_RANGE_CM = (50, 250)
+WEIGHT_RANGE_KG = (20, 350)
+AGE_RANGE = (1, 120)
+
+# WHO adult BMI bands: (upper bound, label)
+BMI_CATEGORIES = ((18.5, 'underweight'), (25, 'normal'), (30, 'overweight'), (float('inf'), 'obese'))
+# Mifflin-St Jeor sex constant; anything else takes the midpoint
+BMR_SEX_OFFSET = {'male': 5, 'female': -161}
+BMR_DEFAULT_OFFSET = -78
+# Daily minutes of activity -> TDEE multiplier: (minimum minutes, factor, level)
+ACTIVITY_LEVELS = ((90, 1.9, 'very_active'), (60, 1.725, 'active'), (30, 1.55, 'moderate'),
+                   (1, 1.375, 'light'), (0, 1.2, 'sedentary'))
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_FEET_INCHES = re.compile(r"^\s*(\d+)\s*(?:'|ft|feet|foot)\s*(?:(\d+(?:\.\d+)?)\s*(?:\"|''|in|inch|inches)?)?\s*$", re.I)
+_FEET_DOT_INCHES = re.compile(r'^\s*(\d)\.(\d{1,2})\s*$')
+_CLOCK = re.compile(r'^\s*(\d{1,2})(?:\s*[:.]\s*(\d{2}))?\s*(?:([ap])\.?\s*m?\.?)?\s*$', re.I)
+
+def _scalar(value):
+    # The parsers below are memoized, so they may only see hashable input; a list or
+    # object where the form expects text is treated as no answer
+    return value if isinstance(value, (str, int, float)) and not isinstance(value, bool) else None
+
+def _list(value):
+    return value if isinstance(value, list) else []
+
+def _in_range(value, bounds):
+    return value if value is not None and bounds[0] <= value <= bounds[1] else None
+
+def _number(text):
+    # None for no number, and for one too large to be a float (e.g. 400 nines), which
+    # int() and the range checks can't take
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        try:
+            value = float(text)
+        except OverflowError:
+            return None
+    else:
+        match = _NUMBER.search(str(text or ''))
+        value = float(match.group()) if match else None
+    return value if value is not None and math.isfinite(value) else None
+
+@lru_cache(maxsize=4096)
+def height_cm(height, unit):
+    # The form takes free text with a "feet" (ft/in) or "cm" unit. In feet, "5'7",
+    # "5 ft 7 in" and "5.7" all read as 5 ft 7 in; without a unit, small numbers are
+    # read as feet and larger ones as cm.
+    if height is None or height == '':
+        return None
+    text = str(height)
+    if str(unit or '').lower() in ('feet', 'ft') or not unit:
+        match = _FEET_INCHES.match(text)
+        if match:
+            return _in_range(round((int(match.group(1)) * 12 + float(match.group(2) or 0)) * CM_PER_INCH, 1), HEIGHT_RANGE_CM)
+        match = _FEET_DOT_INCHES.match(text)
+        if match and int(match.group(2)) < 12:
+            return _in_range(round((int(match.group(1)) * 12 + int(match.group(2))) * CM_PER_INCH, 1), HEIGHT_RANGE_CM)
+        value = _number(text)
+        if value is not None and value < 10:
+            return _in_range(round(value * 12 * CM_PER_INCH, 1), HEIGHT_RANGE_CM)
+    value = _number(text)
+    return _in_range(round(value, 1), HEIGHT_RANGE_CM) if value is not None else None
+
+@lru_cache(maxsize=4096)
+def weight_kg(weight, unit):
+    value = _number(weight)
+    if value is None:
+        return None
+    if str(unit or '').lower() in ('lbs', 'lb', 'pounds'):
+        value *= KG_PER_LB
+    return _in_range(round(value, 1), WEIGHT_RANGE_KG)
+
+@lru_cache(maxsize=256)
+def age_years(age):
+    value = _number(age)
+    return _in_range(int(value), AGE_RANGE) if value is not None else None
+
+@lru_cache(maxsize=4096)
+def clock_minutes(text):
+    # "7:30 AM", "7 am", "19:30" or "7.30pm" -> minutes since midnight, else None
+    if not isinstance(text, str):
+        return None
+    match = _CLOCK.match(text)
+    if not match:
+        return None
+    hours, minutes, meridiem = int(match.group(1)), int(match.group(2) or 0), (match.group(3) or '').lower()
+    if minutes > 59 or hours > 23 or (meridiem and not 1 <= hours <= 12):
+        return None
+    if meridiem:
+        hours = hours % 12 + (12 if meridiem == 'p' else 0)
+    return hours * 60 + minutes
+
+def bmi_category(bmi):
+    for upper, label in BMI_CATEGORIES:
+        if bmi < upper:
+            return label
+
+def activity_minutes(activities):
+    # Sum of the daily durations listed in the questionnaire ("None" counts as 0)
+    total = 0
+    for activity in _list(activities):
+        if not isinstance(activity, dict) or str(activity.get('type') or '').strip().lower() in ('', 'none'):
+            continue
+        total += _number(activity.get('duration')) or 0
+    return int(total)
+
+def activity_level(minutes):
+    for threshold, factor, level in ACTIVITY_LEVELS:
+        if minutes >= threshold:
+            return factor, level
+
+def meal_schedule(wakeup_time, sleep_time, meals):
+    # Meal times laid out on the waking day (times before waking count as after
+    # midnight), with the gaps the dietitian looks at
+    wake = clock_minutes(_scalar(wakeup_time))
+    sleep = clock_minutes(_scalar(sleep_time))
+    times = [clock_minutes(_scalar(meal.get('time'))) for meal in _list(meals) if isinstance(meal, dict)]
+    times = [time for time in times if time is not None]
+
+    def since_wake(minute):
+        return (minute - wake) % 1440 if wake is not None else minute
+
+    day = sorted(since_wake(time) for time in times)
+    awake = since_wake(sleep) if sleep is not None and wake is not None else None
+    gaps = [later - earlier for earlier, later in zip(day, day[1:])]
+    return {
+        "meal_count": len(day),
+        "awake_minutes": awake or None,
+        "first_meal_after_wake_minutes": day[0] if day and wake is not None else None,
+        "last_meal_before_sleep_minutes": awake - day[-1] if day and awake and day[-1] <= awake else None,
+        "eating_window_minutes": day[-1] - day[0] if len(day) > 1 else None,
+        "longest_gap_minutes": max(gaps) if gaps else None
+    }
+
+def compute_metrics(row):
+    # row: a health_assessments row (column names), as stored or about to be inserted
+    height = height_cm(_scalar(row.get('height')), _scalar(row.get('height_unit')))
+    weight = weight_kg(_scalar(row.get('weight')), _scalar(row.get('weight_unit')))
+    age = age_years(_scalar(row.get('age')))
+    sex = str(row.get('sex') or '').lower()
+
+    bmi = round(weight / (height / 100) ** 2, 1) if height and weight else None
+    bmr = None
+    if height and weight and age:
+        bmr = round(10 * weight + 6.25 * height - 5 * age + BMR_SEX_OFFSET.get(sex, BMR_DEFAULT_OFFSET))
+    minutes = activity_minutes(row.get('activities'))
+    factor, level = activity_level(minutes)
+
+    return {
+        "version": METRICS_VERSION,
+        "height_cm": height,
+        "weight_kg": weight,
+        "bmi": bmi,
+        "bmi_category": bmi_category(bmi) if bmi is not None else None,
+        "bmr_kcal": bmr,
+        "activity_minutes": minutes,
+        "activity_level": level,
+        "tdee_kcal": round(bmr * factor) if bmr is not None else None,
+        **meal_schedule(row.get('wakeup_time'), row.get('sleep_time'), row.get('meals'))
+    }
+
+def compute_batch(rows):
+    # Metrics for many rows at once. The questionnaire's free-text values repeat a
+    # lot (heights, units, clock times), and every parser is memoized, so each
+    # distinct value is parsed once per process however many rows share it.
+    return [compute_metrics(row) for row in rows]
@@ -0,0 +1,106 @@
+import os
+from services.cache import TTLCache
+from services.invalidation import InvalidationChannel
+
+# Cached marker for ids that have no profile row, so they don't re-query on every call
+_NO_PROFILE = object()
+_MISSING = object()
+
+class ProfileRepository:
+    def __init__(self, supabase_service, maxsize=None, ttl=None, channel=None):
+        self.supabase_service = supabase_service
+        # Per worker: writes are written through here and announced on the channel so
+        # other workers drop their copy; without a shared channel the short default
+        # TTL bounds how long they can serve the old row
+        self.cache = TTLCache(
+            maxsize=maxsize or int(os.environ.get('PROFILE_CACHE_SIZE', 4096)),
+            ttl=ttl or int(os.environ.get('PROFILE_CACHE_TTL', 30))
+        )
+        self.listeners = []
+        self.channel = channel or InvalidationChannel('profile')
+        self.channel.subscribe(self._apply_remote)
+
+    def add_listener(self, callback):
+        # Called with the user id after every profile write
+        self.listeners.append(callback)
+
+    def get(self, user_id, client=None):
+        cached = self.cache.get(user_id, _MISSING)
+        if cached is not _MISSING:
+            return None if cached is _NO_PROFILE else cached
+
+        client = client or self.supabase_service.get_client()
+        result = client.table('profiles').select('*').eq('id', user_id).limit(1).execute()
+        profile = result.data[0] if result.data else None
+        self.cache.set(user_id, _NO_PROFILE if profile is None else profile)
+        return profile
+
+    def get_many(self, user_ids, client=None):
+        profiles = {}
+        misses = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = self.cache.get(user_id, _MISSING)
+            if cached is _MISSING:
+                misses.append(user_id)
+            else:
+                profiles[user_id] = None if cached is _NO_PROFILE else cached
+
+        if misses:
+            # Fetch every miss in a single round trip
+            client = client or self.supabase_service.get_client()
+            result = client.table('profiles').select('*').in_('id', misses).execute()
+            found = {row['id']: row for row in result.data or []}
+            for user_id in misses:
+                profile = found.get(user_id)
+                self.cache.set(user_id, _NO_PROFILE if profile is None else profile)
+                profiles[user_id] = profile
+
+        return profiles
+
+    def update(self, user_id, data, client=None):
+        client = client or self.supabase_service.get_client()
+        result = client.table('profiles').update(data).eq('id', user_id).execute()
+
+        # Write-through: keep the row the database returned, or forget the stale one
+        if result.data:
+            self.cache.set(user_id, result.data[0])
+        else:
+            self.cache.pop(user_id)
+        self.channel.publish(user_id)
+        self._notify(user_id)
+        return result.data[0] if result.data else None
+
+    def invalidate(self, user_id):
+        self.cache.pop(user_id)
+        self.channel.publish(user_id)
+        self._notify(user_id)
+
+    def stats(self):
+        return self.cache.stats()
+
+    def _apply_remote(self, user_id):
+        # Another worker wrote this profile; refetch on next use. Listeners aren't
+        # called, since the writing worker already announced its own invalidations.
+        if user_id is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(user_id)
+
+    def _notify(self, user_id):
+        for callback in self.listeners:
+            try:
+                callback(user_id)
+            except Exception as e:
+                print(f"Error in profile listener: {str(e)}")
+
+def to_user(auth_user, profile):
+    # Merge a Supabase auth user with its profile row into the frontend user shape
+    metadata = auth_user.user_metadata or {}
+    return {
+        "id": auth_user.id,
+        "email": auth_user.email,
+        "name": profile.get('name') if profile else metadata.get('name', 'User'),
+        "role": profile.get('role') if profile else 'user',
+        "phone": profile.get('phone') if profile else None,
+        "phoneVerified": profile.get('phone_verified') if profile else False
+    }
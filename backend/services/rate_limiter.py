@@ -0,0 +1,134 @@
+import math
+import os
+import threading
+import time
+import zlib
+from services.cache import TTLCache
+from services.metrics import registry
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Token-bucket rate limiting for the auth endpoints. Each limit allows `count`
+# requests per `seconds`, refilling continuously, with bursts of up to `count`.
+# Buckets are kept per client IP and per identity (email or user id), in this
+# process by default or in Redis when RATE_LIMIT_REDIS_URL is set, so that all
+# workers share them.
+
+DEFAULT_LIMITS = {
+    # name: {scope: "count/seconds"}
+    'login': {'ip': '20/60', 'identity': '5/60'},
+    'register': {'ip': '5/60', 'identity': '3/3600'},
+    'verify_phone': {'ip': '10/60', 'identity': '5/300'}
+}
+
+rate_limited = registry.counter(
+    'rate_limited_requests_total', 'Requests rejected by a rate limit', ('limit', 'scope'))
+
+def parse_limit(text):
+    # "count/seconds" -> (rate per second, burst). A fractional count such as "0.5/1"
+    # (one request per two seconds) still needs room for one whole request.
+    count, _, seconds = text.partition('/')
+    count, seconds = float(count), float(seconds or 1)
+    if count <= 0:
+        return 0, 0
+    return count / seconds, max(count, 1)
+
+def load_limits():
+    # RATE_LIMIT_<NAME>_<SCOPE>=count/seconds overrides a default; a count of 0 turns it off
+    limits = {}
+    for name, scopes in DEFAULT_LIMITS.items():
+        for scope, default in scopes.items():
+            value = os.environ.get(f"RATE_LIMIT_{name.upper()}_{scope.upper()}", default).strip()
+            if not value:
+                continue
+            rate, burst = parse_limit(value)
+            if burst > 0:
+                limits[(name, scope)] = (rate, burst)
+    return limits
+
+class LocalBucketStore:
+    # Buckets split across independently locked shards, so concurrent requests for
+    # different keys rarely contend. A missing bucket is a full one; entries expire
+    # once they would have refilled, which keeps memory bounded.
+    def __init__(self, shards=None, maxsize=None):
+        shards = shards or int(os.environ.get('RATE_LIMIT_SHARDS', 16))
+        maxsize = maxsize or int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+        self.shards = [(threading.Lock(), TTLCache(maxsize=max(1, maxsize // shards))) for _ in range(shards)]
+
+    def take(self, key, rate, burst, cost=1):
+        # Returns 0 when allowed, else the seconds until `cost` tokens are available
+        lock, buckets = self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+        now = time.monotonic()
+        with lock:
+            tokens, updated = buckets.get(key) or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < cost:
+                buckets.set(key, (tokens, now), ttl=(burst - tokens) / rate)
+                return (cost - tokens) / rate
+            tokens -= cost
+            buckets.set(key, (tokens, now), ttl=(burst - tokens) / rate)
+            return 0
+
+class RedisBucketStore:
+    # The same bucket, updated atomically in Redis with the server's clock
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local retry = 0
+    if tokens < cost then
+      retry = (cost - tokens) / rate
+    else
+      tokens = tokens - cost
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+    return tostring(retry)
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst, cost=1):
+        try:
+            return float(self.script(keys=[self.prefix + key], args=[rate, burst, cost]))
+        except redis.RedisError as e:
+            # Fail open: an unavailable limiter must not lock everyone out of login
+            print(f"Error checking rate limit: {str(e)}")
+            return 0
+
+def create_store():
+    url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    return RedisBucketStore(url) if url else LocalBucketStore()
+
+class RateLimiter:
+    def __init__(self, store=None, limits=None):
+        self.store = store or create_store()
+        self.limits = load_limits() if limits is None else limits
+
+    def check(self, name, ip=None, identity=None):
+        # Takes a token from each applicable bucket; returns seconds to wait, or 0.
+        # The IP bucket is checked first so one address can't spread across identities.
+        for scope, value in (('ip', ip), ('identity', identity)):
+            limit = self.limits.get((name, scope))
+            if limit is None or not value:
+                continue
+            rate, burst = limit
+            retry_after = self.store.take(f"{name}:{scope}:{str(value).strip().lower()}", rate, burst)
+            if retry_after > 0:
+                rate_limited.inc(name, scope)
+                return max(1, math.ceil(retry_after))
+        return 0
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from services.file_service import MAX_UPLOAD_BYTES, CHUNK_SIZE, UploadTooLargeError
+
+# Resumable uploads: the client opens a session, PUTs fixed-size chunks at their
+# offsets in any order (retrying only the ones that failed), then completes it.
+# Sessions live on disk so every worker process on the host sees the same state:
+#
+#   <UPLOAD_SESSION_DIR>/<upload_id>/meta.json   upload parameters
+#   <UPLOAD_SESSION_DIR>/<upload_id>/data        the file, written chunk by chunk
+#   <UPLOAD_SESSION_DIR>/<upload_id>/<n>.chunk   marker holding chunk n's sha256
+UPLOAD_SESSION_DIR = os.environ.get('UPLOAD_SESSION_DIR') or os.path.join(tempfile.gettempdir(), 'urjaa-uploads')
+# Seconds an upload may sit idle before it is discarded
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))
+DEFAULT_UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+MIN_UPLOAD_CHUNK_SIZE = 64 * 1024
+PURGE_INTERVAL = 60
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+class UploadNotFoundError(Exception):
+    pass
+
+class ResumableUploadService:
+    def __init__(self, file_service, root=None, ttl=None):
+        self.file_service = file_service
+        self.root = root or UPLOAD_SESSION_DIR
+        self.ttl = ttl or UPLOAD_SESSION_TTL
+        self.last_purge = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def create(self, data):
+        try:
+            self.purge_expired()
+
+            for field in ('bucket_id', 'user_id', 'filename'):
+                if not data.get(field):
+                    return {"error": f"{field} is required"}
+
+            size = data.get('size')
+            if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+                return {"error": "size must be a positive integer"}
+            if size > MAX_UPLOAD_BYTES:
+                raise UploadTooLargeError(f"File exceeds the {MAX_UPLOAD_BYTES} byte limit")
+
+            chunk_size = data.get('chunk_size') or DEFAULT_UPLOAD_CHUNK_SIZE
+            if not isinstance(chunk_size, int) or not MIN_UPLOAD_CHUNK_SIZE <= chunk_size <= MAX_UPLOAD_BYTES:
+                return {"error": f"chunk_size must be between {MIN_UPLOAD_CHUNK_SIZE} and {MAX_UPLOAD_BYTES}"}
+
+            upload_id = uuid.uuid4().hex
+            meta = {
+                "bucket_id": data['bucket_id'],
+                "user_id": data['user_id'],
+                "filename": data['filename'],
+                "custom_path": data.get('custom_path'),
+                "is_public": data.get('is_public', True),
+                "content_type": data.get('content_type'),
+                "sha256": (data.get('sha256') or '').lower() or None,
+                "size": size,
+                "chunk_size": chunk_size
+            }
+
+            directory = self._directory(upload_id)
+            os.makedirs(directory)
+            with open(os.path.join(directory, 'data'), 'wb') as f:
+                f.truncate(size)
+            self._write_atomic(os.path.join(directory, 'meta.json'), json.dumps(meta))
+
+            return self._status(upload_id, meta)
+        except UploadTooLargeError:
+            raise
+        except Exception as e:
+            return {"error": str(e)}
+
+    def put_chunk(self, upload_id, offset, stream, content_length=None, checksum=None):
+        meta = self._load(upload_id)
+        size, chunk_size = meta['size'], meta['chunk_size']
+        if offset is None or offset < 0 or offset >= size or offset % chunk_size:
+            return {"error": f"offset must be a multiple of {chunk_size} below {size}"}
+
+        index = offset // chunk_size
+        expected = min(chunk_size, size - offset)
+        if content_length is not None and content_length != expected:
+            return {"error": f"Chunk {index} must be {expected} bytes"}
+
+        directory = self._directory(upload_id)
+        marker = os.path.join(directory, f"{index}.chunk")
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            fd = os.open(os.path.join(directory, 'data'), os.O_WRONLY)
+        except FileNotFoundError:
+            raise UploadNotFoundError("Upload not found")
+
+        try:
+            # A resent chunk replaces the old one, so forget it until this copy checks out
+            if os.path.exists(marker):
+                os.remove(marker)
+            while True:
+                piece = stream.read(min(CHUNK_SIZE, expected + 1 - written))
+                if not piece:
+                    break
+                if written + len(piece) > expected:
+                    return {"error": f"Chunk {index} must be {expected} bytes"}
+                os.pwrite(fd, piece, offset + written)
+                digest.update(piece)
+                written += len(piece)
+        finally:
+            os.close(fd)
+
+        if written != expected:
+            return {"error": f"Chunk {index} must be {expected} bytes, got {written}"}
+        if checksum and checksum.lower() != digest.hexdigest():
+            return {"error": f"Checksum mismatch for chunk {index}"}
+
+        self._write_atomic(marker, digest.hexdigest())
+        # Any activity keeps the session alive
+        os.utime(os.path.join(directory, 'meta.json'))
+        return self._status(upload_id, meta)
+
+    def status(self, upload_id):
+        return self._status(upload_id, self._load(upload_id))
+
+    def complete(self, upload_id):
+        meta = self._load(upload_id)
+        status = self._status(upload_id, meta)
+        if status['missingChunks']:
+            return {**status, "error": "Upload has missing chunks"}
+
+        # Claim the session so a concurrent complete or chunk can't touch it mid-upload
+        directory = self._directory(upload_id)
+        claimed = f"{directory}.completing"
+        try:
+            os.rename(directory, claimed)
+        except FileNotFoundError:
+            raise UploadNotFoundError("Upload not found")
+
+        try:
+            data_path = os.path.join(claimed, 'data')
+            if meta['sha256'] and self._file_digest(data_path) != meta['sha256']:
+                shutil.rmtree(claimed, ignore_errors=True)
+                return {"error": "Checksum mismatch for the assembled file"}
+
+            with open(data_path, 'rb') as stream:
+                result = self.file_service.upload_file(
+                    meta['bucket_id'],
+                    meta['user_id'],
+                    stream,
+                    meta['filename'],
+                    meta['custom_path'],
+                    meta['is_public'],
+                    content_type=meta['content_type'],
+                    content_length=meta['size'],
+                    content_sha256=meta['sha256']
+                )
+        except Exception:
+            os.rename(claimed, directory)
+            raise
+
+        if result.get('error'):
+            # Keep the chunks so the client can retry the complete call
+            os.rename(claimed, directory)
+            return result
+
+        shutil.rmtree(claimed, ignore_errors=True)
+        return result
+
+    def abort(self, upload_id):
+        self._load(upload_id)
+        shutil.rmtree(self._directory(upload_id), ignore_errors=True)
+        return {"success": True}
+
+    def purge_expired(self, force=False):
+        # Sweeps abandoned sessions at most once a minute per process
+        now = time.time()
+        if not force and now - self.last_purge < PURGE_INTERVAL:
+            return 0
+        self.last_purge = now
+
+        purged = 0
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            try:
+                idle_since = os.path.getmtime(os.path.join(directory, 'meta.json'))
+            except OSError:
+                # Half-created or half-completed sessions age by the directory itself
+                try:
+                    idle_since = os.path.getmtime(directory)
+                except OSError:
+                    continue
+            if idle_since + self.ttl <= now:
+                shutil.rmtree(directory, ignore_errors=True)
+                purged += 1
+        return purged
+
+    def _directory(self, upload_id):
+        return os.path.join(self.root, upload_id)
+
+    def _load(self, upload_id):
+        if not upload_id or not _UPLOAD_ID.match(upload_id):
+            raise UploadNotFoundError("Upload not found")
+        meta_path = os.path.join(self._directory(upload_id), 'meta.json')
+        try:
+            if os.path.getmtime(meta_path) + self.ttl <= time.time():
+                shutil.rmtree(self._directory(upload_id), ignore_errors=True)
+                raise UploadNotFoundError("Upload has expired")
+            with open(meta_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, NotADirectoryError):
+            raise UploadNotFoundError("Upload not found")
+
+    def _status(self, upload_id, meta):
+        directory = self._directory(upload_id)
+        total_chunks = -(-meta['size'] // meta['chunk_size'])
+        received = set()
+        for name in os.listdir(directory):
+            if name.endswith('.chunk'):
+                received.add(int(name[:-len('.chunk')]))
+
+        missing = [index for index in range(total_chunks) if index not in received]
+        last_chunk = meta['size'] - (total_chunks - 1) * meta['chunk_size']
+        bytes_received = len(received) * meta['chunk_size']
+        if total_chunks - 1 in received:
+            bytes_received -= meta['chunk_size'] - last_chunk
+
+        return {
+            "uploadId": upload_id,
+            "size": meta['size'],
+            "chunkSize": meta['chunk_size'],
+            "totalChunks": total_chunks,
+            "receivedChunks": len(received),
+            "missingChunks": missing,
+            "bytesReceived": bytes_received,
+            "expiresAt": os.path.getmtime(os.path.join(directory, 'meta.json')) + self.ttl,
+            "error": None
+        }
+
+    def _file_digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for piece in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(piece)
+        return digest.hexdigest()
+
+    def _write_atomic(self, path, text):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(text)
+        os.replace(temp_path, path)
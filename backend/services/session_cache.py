@@ -0,0 +1,66 @@
+import hashlib
+import os
+import time
+from services.cache import TTLCache
+from services.invalidation import InvalidationChannel
+from services.jwt_utils import decode_claims, get_expiry, verify_token
+
+def _token_hash(access_token):
+    # Tokens are announced to other workers by hash, never in the clear
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+class SessionCache:
+    def __init__(self, jwt_secret=None, maxsize=None, ttl=None, channel=None):
+        self.jwt_secret = jwt_secret or os.environ.get('SUPABASE_JWT_SECRET')
+        # Each worker caches on its own. A short default TTL bounds how long another
+        # worker can serve a session after a logout or profile change; with a shared
+        # invalidation channel the entry is dropped everywhere right away.
+        self.cache = TTLCache(
+            maxsize=maxsize or int(os.environ.get('SESSION_CACHE_SIZE', 4096)),
+            ttl=ttl or int(os.environ.get('SESSION_CACHE_TTL', 30))
+        )
+        self.channel = channel or InvalidationChannel('session')
+        self.channel.subscribe(self._apply_remote)
+
+    def verify(self, access_token):
+        # Without the project JWT secret we can only check expiry locally;
+        # the signature is then left to the upstream get_user call
+        if self.jwt_secret:
+            return verify_token(access_token, self.jwt_secret)
+
+        expires_at = get_expiry(access_token)
+        if expires_at is None or expires_at <= time.time():
+            return None
+        return decode_claims(access_token)
+
+    def get(self, access_token):
+        return self.cache.get(access_token)
+
+    def set(self, access_token, session, claims):
+        # Never keep a session around for longer than its token is valid
+        self.cache.set(access_token, session, expires_at=float(claims['exp']))
+
+    def invalidate(self, access_token):
+        self.cache.pop(access_token)
+        self.channel.publish(f"token:{_token_hash(access_token)}")
+
+    def invalidate_user(self, user_id):
+        self.channel.publish(f"user:{user_id}")
+        return self._drop_user(user_id)
+
+    def _drop_user(self, user_id):
+        return self.cache.pop_where(lambda session: (session.get('user') or {}).get('id') == user_id)
+
+    def _apply_remote(self, key):
+        # Invalidations published by other workers
+        kind, _, value = (key or '').partition(':')
+        if kind == 'user':
+            self._drop_user(value)
+        elif kind == 'token':
+            self.cache.pop_where(
+                lambda session: _token_hash((session.get('session') or {}).get('access_token') or '') == value)
+        else:
+            self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,224 @@
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from services.appointment_transformer import DURATION_MINUTES
+
+# In-memory booking grid: for each day, one bitmap per dietitian where bit n is the
+# n-th slot from APPOINTMENT_DAY_START. Days are loaded from the appointments table
+# on first use (one query for a whole range) and reloaded after AVAILABILITY_TTL
+# seconds, so bookings made elsewhere show up; this process's own creates and
+# updates are applied as they happen. Appointments with no dietitian are requests
+# waiting to be assigned: they hold no slot and are never checked for clashes.
+#
+# The index answers availability and rejects clashing creates and moves quickly; the
+# unique index on (dietitian, date, time) in the database is what holds across workers.
+SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', 30))
+DAY_START = os.environ.get('APPOINTMENT_DAY_START', '09:00')
+DAY_END = os.environ.get('APPOINTMENT_DAY_END', '17:00')
+AVAILABILITY_TTL = float(os.environ.get('AVAILABILITY_TTL', 60))
+# Statuses that don't hold a slot
+FREE_STATUSES = ('cancelled',)
+MAX_AVAILABILITY_DAYS = 31
+# Loaded days kept at most; the least recently loaded go first
+MAX_INDEXED_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', 400))
+# "9:30 AM", "9:30am" or "14:30"
+TIME_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})\s*([AaPp][Mm])?$')
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+def parse_time(appointment_time):
+    # Minutes after midnight, or None when the value isn't a time of day
+    if not isinstance(appointment_time, str):
+        return None
+    return _parse_time(appointment_time.strip())
+
+@lru_cache(maxsize=4096)
+def _parse_time(appointment_time):
+    match = TIME_PATTERN.match(appointment_time)
+    if not match:
+        return None
+    hours, minutes, modifier = int(match.group(1)), int(match.group(2)), match.group(3)
+    if minutes > 59:
+        return None
+    if modifier:
+        if not 1 <= hours <= 12:
+            return None
+        hours = hours % 12 + (12 if modifier.upper() == 'PM' else 0)
+    elif hours > 23:
+        return None
+    return hours * 60 + minutes
+
+def slot_label(minutes):
+    # The booking UI's format, e.g. "9:00 AM"
+    hours, minutes = divmod(minutes, 60)
+    return f"{(hours - 1) % 12 + 1}:{minutes:02d} {'AM' if hours < 12 else 'PM'}"
+
+class SlotUnavailableError(Exception):
+    pass
+
+class _Day:
+    def __init__(self, loaded_at):
+        self.loaded_at = loaded_at
+        self.booked = {}   # dietitian key -> bitmap
+        self.owners = {}   # appointment id -> (dietitian key, mask)
+
+    def add(self, key, mask, appointment_id=None):
+        self.booked[key] = self.booked.get(key, 0) | mask
+        if appointment_id is not None:
+            self.owners[appointment_id] = (key, mask)
+
+    def remove(self, key, mask):
+        # Other appointments may overlap the same slots, so rebuild the key's bitmap
+        remaining = 0
+        for owner_key, owner_mask in self.owners.values():
+            if owner_key == key:
+                remaining |= owner_mask
+        self.booked[key] = remaining
+
+class SlotIndex:
+    def __init__(self, load_rows, ttl=None, day_start=None, day_end=None, slot_minutes=None):
+        # load_rows(dates) -> appointment rows (id, dietitian_id, appointment_date,
+        # appointment_time, status) on those dates
+        self.load_rows = load_rows
+        self.ttl = AVAILABILITY_TTL if ttl is None else ttl
+        self.slot_minutes = slot_minutes or SLOT_MINUTES
+        self.day_start = _minutes(day_start or DAY_START)
+        self.day_end = _minutes(day_end or DAY_END)
+        self.slot_count = max(0, (self.day_end - self.day_start) // self.slot_minutes)
+        self.days = {}
+        # Reservations whose insert hasn't returned yet: (date, key) -> mask. Kept
+        # apart so a reload of the day can't drop them.
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.loads = 0
+
+    def mask(self, appointment_time):
+        # Bits of every slot an appointment at this time overlaps; 0 when it falls
+        # outside the bookable day or can't be parsed, so a bad stored row books nothing
+        minutes = parse_time(appointment_time)
+        if minutes is None:
+            return 0
+        start = minutes - self.day_start
+        end = start + DURATION_MINUTES
+        first = max(0, start // self.slot_minutes)
+        last = min(self.slot_count, -(-end // self.slot_minutes))
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def bookable(self, minutes):
+        # Whether an appointment starting then ends within the bookable day
+        return self.day_start <= minutes and minutes + DURATION_MINUTES <= self.day_end
+
+    def availability(self, dietitian_id, dates):
+        # {date: [free slot labels]} for one dietitian; without one every slot is free,
+        # as unassigned requests don't use up capacity
+        key = dietitian_id or None
+        if key is not None:
+            self.ensure(dates)
+        free = {}
+        with self.lock:
+            for date in dates:
+                booked = self._booked(date, key) if key is not None else 0
+                free[date] = [slot_label(self.day_start + n * self.slot_minutes)
+                              for n in range(self.slot_count) if not booked >> n & 1]
+        return free
+
+    def reserve(self, dietitian_id, date, appointment_time, appointment_id=None):
+        # Claims the slot for an insert or move about to happen; raises if it is
+        # taken. `appointment_id` is the appointment being moved, whose own slots
+        # don't count against it. Returns a reservation for confirm() or release();
+        # an unassigned appointment reserves nothing.
+        key = dietitian_id or None
+        mask = self.mask(appointment_time) if key is not None else 0
+        if not mask:
+            return date, key, 0
+        self.ensure([date])
+        with self.lock:
+            if self._booked(date, key, exclude=appointment_id) & mask:
+                raise SlotUnavailableError("That time slot is no longer available")
+            if mask:
+                self.pending[(date, key)] = self.pending.get((date, key), 0) | mask
+        return date, key, mask
+
+    def confirm(self, reservation, appointment_id):
+        date, key, mask = reservation
+        with self.lock:
+            self._unpend(date, key, mask)
+            day = self.days.get(date)
+            if day is not None and mask:
+                day.add(key, mask, appointment_id)
+
+    def release(self, reservation, taken=False):
+        # The insert failed; `taken` means the database already had the slot booked
+        date, key, mask = reservation
+        with self.lock:
+            self._unpend(date, key, mask)
+            if taken and date in self.days:
+                # Booked by another worker; reload the day on next use
+                self.days[date].loaded_at = 0
+
+    def apply(self, row):
+        # Brings the index in line with a written appointment row
+        appointment_id = row.get('id')
+        with self.lock:
+            for day in self.days.values():
+                owner = day.owners.pop(appointment_id, None)
+                if owner is not None:
+                    day.remove(*owner)
+            day = self.days.get(row.get('appointment_date'))
+            if day is not None and row.get('dietitian_id') and row.get('status') not in FREE_STATUSES:
+                mask = self.mask(row.get('appointment_time'))
+                if mask:
+                    day.add(row.get('dietitian_id'), mask, appointment_id)
+
+    def ensure(self, dates):
+        # Loads missing or stale days, all in one query
+        now = time.monotonic()
+        with self.lock:
+            stale = [date for date in dates
+                     if date not in self.days or now - self.days[date].loaded_at >= self.ttl]
+        if not stale:
+            return
+
+        days = {date: _Day(now) for date in stale}
+        for row in self.load_rows(stale):
+            day = days.get(row.get('appointment_date'))
+            if day is None or not row.get('dietitian_id') or row.get('status') in FREE_STATUSES:
+                continue
+            mask = self.mask(row.get('appointment_time'))
+            if mask:
+                day.add(row.get('dietitian_id'), mask, row.get('id'))
+        with self.lock:
+            self.days.update(days)
+            self.loads += 1
+            if len(self.days) > MAX_INDEXED_DAYS:
+                for date in sorted(self.days, key=lambda date: self.days[date].loaded_at)[:len(self.days) - MAX_INDEXED_DAYS]:
+                    if date not in dates:
+                        del self.days[date]
+
+    def stats(self):
+        with self.lock:
+            return {"days": len(self.days), "pending": len(self.pending), "loads": self.loads}
+
+    def _booked(self, date, key, exclude=None):
+        day = self.days.get(date)
+        booked = 0
+        if day is not None and exclude in day.owners:
+            for owner_id, (owner_key, owner_mask) in day.owners.items():
+                if owner_key == key and owner_id != exclude:
+                    booked |= owner_mask
+        elif day is not None:
+            booked = day.booked.get(key, 0)
+        return booked | self.pending.get((date, key), 0)
+
+    def _unpend(self, date, key, mask):
+        remaining = self.pending.get((date, key), 0) & ~mask
+        if remaining:
+            self.pending[(date, key)] = remaining
+        else:
+            self.pending.pop((date, key), None)
@@ -0,0 +1,104 @@
+import threading
+import time
+
+# Collects writes that arrive close together and hands them to one flush call, so a
+# burst of updates from concurrent requests costs a few round trips instead of one
+# each. A write that finds the queue idle flushes at once; writes arriving while a
+# flush is in flight gather behind it (plus an optional fixed window) and go out
+# together next. The first caller of each batch flushes for everyone; there is no
+# background thread.
+#
+# Callers' writes are never merged: a key holds one caller's payload per batch, and
+# a second caller writing the same key goes into a later batch, so each write is
+# applied (and reported) as it was sent, in arrival order.
+
+class _Waiter:
+    def __init__(self, keys):
+        self.keys = keys
+        self.results = {}
+        self.done = threading.Event()
+
+class _Batch:
+    def __init__(self):
+        self.payloads = {}
+        self.owners = {}
+        self.waiters = []
+
+class WriteCoalescer:
+    def __init__(self, flush, window=0, timeout=30):
+        # flush({key: payload}) -> {key: result}
+        self.flush = flush
+        self.window = window
+        self.timeout = timeout
+        self.queue = []
+        self.flushing = False
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.flushes = 0
+        self.writes = 0
+
+    def submit_many(self, items):
+        # items: [(key, payload)]; returns one result per item, in order. A key given
+        # twice in one call is merged (later fields win), as it is one caller's change.
+        if not items:
+            return []
+        waiter = _Waiter([key for key, _ in items])
+        with self.lock:
+            batch = self._batch_for(waiter.keys)
+            lead = batch is None
+            if lead:
+                batch = _Batch()
+                self.queue.append(batch)
+            for key, payload in items:
+                batch.payloads[key] = {**batch.payloads.get(key, {}), **payload}
+                batch.owners[key] = waiter
+            batch.waiters.append(waiter)
+            self.writes += len(items)
+
+        if lead:
+            if self.window > 0:
+                time.sleep(self.window)
+            self._flush_batch(batch)
+
+        if not waiter.done.wait(self.timeout):
+            return [{"error": "Timed out waiting for the write to be applied"} for _ in items]
+        return [waiter.results[key] for key in waiter.keys]
+
+    def submit(self, key, payload):
+        return self.submit_many([(key, payload)])[0]
+
+    def stats(self):
+        with self.lock:
+            pending = sum(len(batch.payloads) for batch in self.queue)
+        return {"writes": self.writes, "flushes": self.flushes, "pending": pending}
+
+    def _batch_for(self, keys):
+        # The first queued batch after the last one holding any of these keys, so
+        # writes to a key keep their order; None when a new batch is needed
+        start = 0
+        for index, batch in enumerate(self.queue):
+            if any(key in batch.owners for key in keys):
+                start = index + 1
+        return self.queue[start] if start < len(self.queue) else None
+
+    def _flush_batch(self, batch):
+        with self.lock:
+            # One flush at a time, in queue order; everything queued meanwhile rides on a later one
+            while self.flushing or self.queue[0] is not batch:
+                self.idle.wait()
+            self.queue.pop(0)
+            self.flushing = True
+            self.flushes += 1
+
+        try:
+            results = self.flush(batch.payloads)
+        except Exception as e:
+            results = {key: {"error": str(e)} for key in batch.payloads}
+        finally:
+            with self.lock:
+                self.flushing = False
+                self.idle.notify_all()
+
+        for waiter in batch.waiters:
+            waiter.results = {key: results.get(key, {"error": "Write was not applied"}) for key in waiter.keys}
+            waiter.done.set()
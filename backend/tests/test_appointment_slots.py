@@ -0,0 +1,40 @@
+import pytest
+from services.supabase_service import SupabaseService
+from services.appointment_service import AppointmentService, SLOT_TAKEN
+from services.slot_index import SlotUnavailableError
+
+DIETITIAN = '00000000-0000-0000-0000-0000000000d1'
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv('SUPABASE_BACKEND', 'memory')
+    return AppointmentService(SupabaseService())
+
+def create(service, time, dietitian_id=None):
+    return service.create_appointment({'date': '2026-11-02', 'time': time, 'type': 'video', 'userId': 'u',
+                                       'dietitianId': dietitian_id})
+
+def test_unassigned_requests_hold_no_slot(service):
+    assert create(service, '10:00 AM')['success']
+    assert create(service, '10:00 AM')['success']
+    assert '10:00 AM' in service.get_availability(date_from='2026-11-02')['days'][0]['available']
+
+def test_times_are_validated_and_normalized(service):
+    assert create(service, '10:30am', DIETITIAN)['appointment']['appointment_time'] == '10:30 AM'
+    assert create(service, '3:00 AM', DIETITIAN)['error']
+    assert create(service, '30AM', DIETITIAN)['error']
+    with pytest.raises(SlotUnavailableError):
+        create(service, '10:30 AM', DIETITIAN)
+
+def test_moves_are_checked_like_creates(service):
+    booked = create(service, '10:00 AM', DIETITIAN)['appointment']['id']
+    moved = create(service, '11:00 AM', DIETITIAN)['appointment']['id']
+
+    with pytest.raises(SlotUnavailableError):
+        service.update_appointment(moved, {'appointment_time': '10:00am'})
+    # Overlapping only its own current slot is fine
+    assert service.update_appointment(moved, {'appointment_time': '11:15 AM'})['appointment']['appointment_time'] == '11:15 AM'
+    assert service.update_appointment(moved, {'appointment_time': '3:00 AM'})['error']
+
+    result = service.update_appointments([{'id': moved, 'appointment_time': '10:00 AM'}, {'id': booked, 'status': 'confirmed'}])
+    assert [item.get('error') for item in result['results']] == [SLOT_TAKEN, None]
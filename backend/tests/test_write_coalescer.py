@@ -0,0 +1,66 @@
+import threading
+import pytest
+from services.write_coalescer import WriteCoalescer
+from services.supabase_service import SupabaseService
+from services.appointment_service import AppointmentService
+
+def test_writes_queued_behind_a_flush_go_out_together():
+    release = threading.Event()
+    flushed = []
+
+    def flush(payloads):
+        flushed.append(dict(payloads))
+        if len(flushed) == 1:
+            release.wait(5)
+        return {key: {"success": True, **payload} for key, payload in payloads.items()}
+
+    coalescer = WriteCoalescer(flush)
+    first = threading.Thread(target=coalescer.submit, args=('a', {'status': 'confirmed'}))
+    first.start()
+    while not flushed:
+        pass
+
+    # Both queue behind the in-flight flush; the same key from two callers isn't merged
+    results = {}
+    callers = [
+        threading.Thread(target=lambda: results.update(b=coalescer.submit('b', {'status': 'confirmed'}))),
+        threading.Thread(target=lambda: results.update(a=coalescer.submit('a', {'notes': 'later'}))),
+    ]
+    for caller in callers:
+        caller.start()
+    while coalescer.stats()['pending'] < 2:
+        pass
+    release.set()
+    for thread in [first, *callers]:
+        thread.join(5)
+
+    assert flushed[1] == {'b': {'status': 'confirmed'}, 'a': {'notes': 'later'}}
+    assert results['a'] == {"success": True, 'notes': 'later'}
+    assert results['b'] == {"success": True, 'status': 'confirmed'}
+
+@pytest.fixture
+def appointments(monkeypatch):
+    monkeypatch.setenv('SUPABASE_BACKEND', 'memory')
+    service = AppointmentService(SupabaseService())
+    rows = service.supabase_service.get_client().table('appointments').insert([
+        {'appointment_date': '2026-11-02', 'appointment_time': f"{hour}:00 AM", 'status': 'requested', 'user_id': 'u'}
+        for hour in (9, 10)
+    ]).execute().data
+    return service, [row['id'] for row in rows]
+
+def test_bad_change_fails_only_its_own_id(appointments):
+    # One caller's unpreparable change shares a flush with another caller's valid one
+    service, (bad, good) = appointments
+    results = service._flush_updates({bad: {'notes': ['not', 'hashable']}, good: {'status': 'confirmed'}})
+
+    assert results[bad].get('error')
+    assert results[good]['success'] is True
+    assert results[good]['appointment']['status'] == 'confirmed'
+
+def test_non_string_fields_are_rejected_before_queueing(appointments):
+    service, (bad, good) = appointments
+    assert service.update_appointment(bad, {'notes': ['bad']}) == {"error": "notes must be a string"}
+
+    result = service.update_appointments([{'id': bad, 'reason': {'x': 1}}, {'id': good, 'status': 'confirmed'}])
+    assert [item['success'] for item in result['results']] == [False, True]
+    assert service.updates.stats()['writes'] == 1
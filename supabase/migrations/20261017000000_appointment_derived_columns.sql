@@ -0,0 +1,15 @@
+-- Appointment type and normalized timestamp, computed by the backend when an
+-- appointment is created or updated so list endpoints don't re-parse them per read.
+alter table public.appointments
+  add column if not exists appointment_type text,
+  add column if not exists scheduled_at timestamp;
+
+-- Existing rows get their type here; scheduled_at is left null and is parsed
+-- on read by the backend's legacy path until the row is next written.
+update public.appointments
+set appointment_type = case
+  when lower(coalesce(notes, '') || coalesce(reason, '')) like '%video%' then 'video'
+  when lower(coalesce(notes, '') || coalesce(reason, '')) like '%phone%' then 'phone'
+  else 'in-person'
+end
+where appointment_type is null;
@@ -0,0 +1,14 @@
+-- Serves GET /api/dietitian/<id>/appointments: equality on dietitian_id, a range on
+-- appointment_date and keyset order on (appointment_date, id) all come from one
+-- index scan, so the query reads only the rows in the window however large the
+-- table grows. status is carried in the index so the status filter needs no heap
+-- lookups. Check with:
+--
+--   explain analyze
+--   select * from public.appointments
+--   where dietitian_id = '<id>' and appointment_date between '2024-03-01' and '2024-03-07'
+--     and status in ('requested', 'confirmed')
+--   order by appointment_date, id;
+create index if not exists appointments_dietitian_date_idx
+  on public.appointments (dietitian_id, appointment_date, id)
+  include (status);
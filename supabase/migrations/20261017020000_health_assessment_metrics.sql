@@ -0,0 +1,24 @@
+-- Metrics derived from each assessment (BMI, BMR/TDEE, meal timing), computed by the
+-- backend when the assessment is stored. Existing rows are filled in by
+-- POST /api/health-assessment/metrics/recompute, which also rewrites them whenever
+-- the formulas change.
+alter table public.health_assessments
+  add column if not exists derived_metrics jsonb;
+
+-- Writes recomputed metrics for many rows in one call:
+-- updates = [{"id": "...", "derived_metrics": {...}}, ...]. Rows that no longer
+-- exist are skipped, and updated_at is left alone since the answers didn't change.
+-- Returns the number of rows updated.
+create or replace function public.set_health_assessment_metrics(updates jsonb)
+returns integer
+language sql
+as $$
+  with changed as (
+    update public.health_assessments as assessment
+    set derived_metrics = source.derived_metrics
+    from jsonb_to_recordset(updates) as source(id uuid, derived_metrics jsonb)
+    where assessment.id = source.id
+    returning 1
+  )
+  select count(*)::integer from changed;
+$$;
@@ -0,0 +1,14 @@
+-- One active booking per dietitian and slot. Unassigned appointments are requests
+-- waiting for a dietitian and hold no slot, so they are left out. The backend's
+-- in-memory slot index rejects most clashes before they get here; this makes the
+-- rule hold across workers and hosts.
+--
+-- Existing double bookings must be resolved before this applies. To list them:
+--   select appointment_date, appointment_time, dietitian_id, count(*)
+--   from public.appointments where status <> 'cancelled' and dietitian_id is not null
+--   group by 1, 2, 3 having count(*) > 1;
+--
+-- Date first, so the index also serves the slot index's per-day loads.
+create unique index if not exists appointments_active_slot_key
+  on public.appointments (appointment_date, appointment_time, dietitian_id)
+  where status <> 'cancelled' and dietitian_id is not null;
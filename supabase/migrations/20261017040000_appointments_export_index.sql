@@ -0,0 +1,13 @@
+-- Serves GET /api/export/appointments: each page is
+--   where (appointment_date, id) > (<last date>, <last id>) order by appointment_date, id limit <n>
+-- and with no user or dietitian filter, only an index on (appointment_date, id)
+-- lets that read one page instead of sorting the whole table per request.
+-- health_assessments pages on id and uses its primary key. Check with:
+--
+--   explain analyze
+--   select * from public.appointments
+--   where appointment_date > '2024-03-01' or (appointment_date = '2024-03-01' and id > '<id>')
+--   order by appointment_date, id
+--   limit 1000;
+create index if not exists appointments_date_id_idx
+  on public.appointments (appointment_date, id);